@@ -0,0 +1,178 @@
+import sys
+import time
+
+from selenium import webdriver
+from selenium.common.exceptions import WebDriverException
+
+LOGGING = False
+
+WINDOW_SIZE = (800, 600)
+BLOCKED_RESOURCE_TYPES = ['image', 'font', 'media']
+BLOCKED_URL_PATTERNS = [
+    '*google-analytics.com*',
+    '*googletagmanager.com*',
+    '*doubleclick.net*',
+    '*segment.io*',
+    '*sentry.io*',
+    '*hotjar.com*',
+    '*intercom.io*',
+]
+
+# Chrome can only block by URL from selenium, so each resource type maps to its file extensions
+RESOURCE_TYPE_PATTERNS = {
+    'image': ['*.png*', '*.jpg*', '*.jpeg*', '*.gif*', '*.webp*', '*.svg*', '*.ico*', '*pbs.twimg.com/media*'],
+    'font': ['*.woff*', '*.ttf*', '*.otf*', '*.eot*'],
+    'media': ['*.mp4*', '*.webm*', '*.m3u8*', '*.mp3*', '*video.twimg.com*'],
+    'stylesheet': ['*.css*'],
+}
+
+# Total bytes and request count for everything the page loaded
+PAGE_WEIGHT_JS = """
+var entries = performance.getEntriesByType('navigation').concat(performance.getEntriesByType('resource'));
+var bytes = 0;
+for (var i = 0; i < entries.length; i++) {
+    bytes += entries[i].transferSize || entries[i].encodedBodySize || 0;
+}
+return [bytes, entries.length];
+"""
+
+class BrowserProfile:
+    """
+    Settings for a scraping browser: headless mode, a small window,
+    and blocking for resources the scrapers never read (images, fonts, video, analytics)
+    """
+    def __init__(self, headless=True, blocked_types=BLOCKED_RESOURCE_TYPES,
+            blocked_urls=BLOCKED_URL_PATTERNS, window_size=WINDOW_SIZE):
+        """
+        Args:
+            headless (bool): run without a visible window
+            blocked_types (list of str): resource types to block, keys of RESOURCE_TYPE_PATTERNS
+            blocked_urls (list of str): extra URL patterns to block, '*' is a wildcard
+            window_size (tuple of int): width, height
+        """
+        self.headless = headless
+        self.blocked_types = list(blocked_types)
+        self.blocked_urls = list(blocked_urls)
+        self.window_size = window_size
+
+    def blocked_patterns(self):
+        """
+        Returns:
+            list (str): every URL pattern this profile blocks
+        """
+        patterns = list(self.blocked_urls)
+        for t in self.blocked_types:
+            patterns.extend(RESOURCE_TYPE_PATTERNS.get(t, []))
+        return patterns
+
+    def chrome_options(self):
+        """
+        Builds the options to start Chrome with
+
+        Returns:
+            webdriver.ChromeOptions: options for this profile
+        """
+        options = webdriver.ChromeOptions()
+        if self.headless:
+            options.add_argument('--headless')
+        options.add_argument('--window-size={},{}'.format(*self.window_size))
+        options.add_argument('--disable-extensions')
+        options.add_argument('--mute-audio')
+        if 'image' in self.blocked_types:
+            options.add_argument('--blink-settings=imagesEnabled=false')
+            options.add_experimental_option('prefs', {'profile.managed_default_content_settings.images': 2})
+        return options
+
+    def apply(self, driver):
+        """
+        Turns on URL blocking in a running browser
+
+        Args:
+            driver (webdriver.Chrome): browser started with chrome_options()
+        """
+        try:
+            driver.execute_cdp_cmd('Network.enable', {})
+            driver.execute_cdp_cmd('Network.setBlockedURLs', {'urls': self.blocked_patterns()})
+            driver.execute_cdp_cmd('Performance.enable', {})
+        except WebDriverException as e:
+            if LOGGING:
+                print('\nError: Could not apply browser profile: {}'.format(e))
+
+# Used by every scraper unless told otherwise
+DEFAULT_PROFILE = BrowserProfile()
+# The old behaviour: visible window, nothing blocked
+FULL_PROFILE = BrowserProfile(headless=False, blocked_types=[], blocked_urls=[], window_size=(1280, 1024))
+
+def cpu_seconds(driver):
+    """
+    Reads how much main-thread time the browser has spent on the current page
+
+    Args:
+        driver (webdriver.Chrome): browser with Performance metrics enabled
+
+    Returns:
+        float: seconds of task time
+    """
+    metrics = driver.execute_cdp_cmd('Performance.getMetrics', {})['metrics']
+    for m in metrics:
+        if m['name'] == 'TaskDuration':
+            return m['value']
+    return 0.0
+
+def measure_page(driver, url, wait=3):
+    """
+    Loads a page and measures what it cost
+
+    Args:
+        driver (webdriver.Chrome): browser to load with
+        url (str): page to load
+        wait (float): seconds to let the page finish loading scripts
+
+    Returns:
+        dict: bytes, requests, cpu_seconds, load_seconds
+    """
+    cpu_before = cpu_seconds(driver)
+    start = time.time()
+    driver.get(url)
+    time.sleep(wait)
+    load_seconds = time.time() - start
+    cpu_after = cpu_seconds(driver)
+    # Cross-site navigation can start a fresh renderer whose counter begins at zero
+    cpu = cpu_after - cpu_before if cpu_after >= cpu_before else cpu_after
+    page_bytes, requests = driver.execute_script(PAGE_WEIGHT_JS)
+    return {'bytes': page_bytes, 'requests': requests,
+            'cpu_seconds': cpu, 'load_seconds': load_seconds}
+
+def compare_profiles(urls, profiles=None):
+    """
+    Loads each url under each profile and prints the bandwidth and CPU used
+
+    Args:
+        urls (list of str): pages to measure
+        profiles (dict): name -> BrowserProfile, defaults to full vs. default
+    """
+    from BrowserSession import new_driver
+
+    if profiles is None:
+        profiles = {'full': FULL_PROFILE, 'default': DEFAULT_PROFILE}
+
+    totals = {}
+    for name, profile in profiles.items():
+        driver = new_driver(profile)
+        totals[name] = {'bytes': 0, 'requests': 0, 'cpu_seconds': 0.0, 'load_seconds': 0.0}
+        for url in urls:
+            result = measure_page(driver, url)
+            for k in totals[name]:
+                totals[name][k] += result[k]
+            print('{:>8} {:>10} KB {:>5} requests {:>6.2f}s cpu  {}'.format(
+                name, result['bytes'] // 1024, result['requests'], result['cpu_seconds'], url))
+        driver.quit()
+
+    print('\n====== Totals over {} pages ======'.format(len(urls)))
+    for name, t in totals.items():
+        print('{:>8} {:>10} KB {:>5} requests {:>6.2f}s cpu {:>6.1f}s load'.format(
+            name, t['bytes'] // 1024, t['requests'], t['cpu_seconds'], t['load_seconds']))
+
+if __name__ == '__main__':
+    # python BrowserProfile.py https://twitter.com/<user> https://discord.com/invite/<id> ...
+    compare_profiles(sys.argv[1:])
@@ -0,0 +1,128 @@
+import json
+import os
+import threading
+from datetime import datetime, timedelta
+
+from selenium import webdriver
+from webdriver_manager.chrome import ChromeDriverManager
+
+from BrowserProfile import DEFAULT_PROFILE
+
+DRIVER_CACHE_FILE = '.chromedriver.json'
+DRIVER_CACHE_DAYS = 7
+LOGGING = False
+
+_driver_path_lock = threading.Lock()
+
+def driver_path():
+    """
+    Finds the chromedriver binary, resolving it with ChromeDriverManager only when needed
+    The resolved path is cached on disk for DRIVER_CACHE_DAYS so later runs skip the lookup
+
+    Returns:
+        str: path to the chromedriver binary
+    """
+    with _driver_path_lock:
+        if os.path.isfile(DRIVER_CACHE_FILE):
+            with open(DRIVER_CACHE_FILE) as f:
+                cache = json.load(f)
+            resolved = datetime.strptime(cache['resolved'], '%Y-%m-%d')
+            fresh = datetime.now() - resolved < timedelta(days=DRIVER_CACHE_DAYS)
+            if fresh and os.path.isfile(cache['path']):
+                return cache['path']
+
+        path = ChromeDriverManager().install()
+        with open(DRIVER_CACHE_FILE, 'w') as f:
+            json.dump({'path': path, 'resolved': datetime.now().strftime('%Y-%m-%d')}, f)
+        return path
+
+def new_driver(profile=DEFAULT_PROFILE):
+    """
+    Starts a new Chrome browser
+
+    Args:
+        profile (BrowserProfile): headless mode, window size and resource blocking
+
+    Returns:
+        webdriver.Chrome: the new browser
+    """
+    driver = webdriver.Chrome(driver_path(), options=profile.chrome_options())
+    profile.apply(driver)
+    print('====== CherryJam driving ======')
+    return driver
+
+class BrowserSession:
+    """
+    A set of Chrome browsers shared by every scraper in a run
+    Scrapers acquire a browser, use it, and release it back so the next stage starts warm
+    """
+    def __init__(self, profile=DEFAULT_PROFILE):
+        self.profile = profile
+        self.idle = []
+        self.drivers = []
+        self.lock = threading.Lock()
+
+    def warm(self, count):
+        """
+        Starts browsers ahead of time so the first stage does not pay for a cold start
+
+        Args:
+            count (int): number of idle browsers to have ready
+        """
+        with self.lock:
+            missing = count - len(self.idle)
+        for i in range(missing):
+            driver = new_driver(self.profile)
+            with self.lock:
+                self.drivers.append(driver)
+                self.idle.append(driver)
+
+    def acquire(self):
+        """
+        Hands out an idle browser, starting a new one if none are free
+
+        Returns:
+            webdriver.Chrome: a browser for the caller to use until release()
+        """
+        with self.lock:
+            if self.idle:
+                return self.idle.pop()
+        driver = new_driver(self.profile)
+        with self.lock:
+            self.drivers.append(driver)
+        return driver
+
+    def release(self, driver):
+        """
+        Returns a browser to the session, clearing state left by the previous scraper
+
+        Args:
+            driver (webdriver.Chrome): browser obtained from acquire()
+        """
+        try:
+            driver.delete_all_cookies()
+            driver.get('about:blank')
+        except Exception as e:
+            # A browser that cannot be reset is not worth keeping
+            if LOGGING:
+                print('\nError: Could not recycle browser: {}'.format(e))
+            with self.lock:
+                self.drivers.remove(driver)
+            driver.quit()
+            return
+        with self.lock:
+            self.idle.append(driver)
+
+    def close(self):
+        """
+        Quits every browser started by this session
+        """
+        with self.lock:
+            drivers = self.drivers
+            self.drivers = []
+            self.idle = []
+        for driver in drivers:
+            try:
+                driver.quit()
+            except Exception:
+                pass
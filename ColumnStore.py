@@ -0,0 +1,310 @@
+import json
+import os
+import sys
+import time
+from collections import namedtuple
+
+import numpy as np
+
+COLUMNS_DIR = './columns'
+
+# How days with no row are filled in by ColumnStore.matrix()
+FILL_NAN = 'nan'        # left as NaN
+FILL_ZERO = 'zero'      # 0
+FILL_FORWARD = 'ffill'  # the last known value; NaN before the first
+FILL_LINEAR = 'linear'  # interpolated between known values; held flat past either end
+FILL_POLICIES = [FILL_NAN, FILL_ZERO, FILL_FORWARD, FILL_LINEAR]
+
+# ids: row labels; days: np.ndarray of datetime64[D] column labels;
+# values: column name -> np.ndarray of shape (len(ids), len(days))
+Series = namedtuple('Series', ['ids', 'days', 'values'])
+
+# Table -> id column, value columns copied into the store
+TABLE_COLUMNS = {
+    'rarity_scraped_data': ('name', ['release_price', 'presale_price', 'quantity']),
+    'twitter_scraped_data': ('twitter_id', ['followers', 'following', 'activity']),
+    'discord_scraped_data': ('discord_id', ['online', 'members', 'activity']),
+    'opensea_scraped_data': ('name', ['price', 'highest_last_sale', 'lowest_price']),
+}
+
+def to_days(dates):
+    """
+    Args:
+        dates (list of str): YYYY-MM-DD
+
+    Returns:
+        np.ndarray (int32): days since 1970-01-01
+    """
+    return np.array(dates, dtype='datetime64[D]').astype(np.int32)
+
+def fill_missing(matrix, policy):
+    """
+    Fills the NaN gaps in each row of a day-indexed matrix, in place
+
+    Args:
+        matrix (np.ndarray): float, one row per id and one column per day
+        policy (str): one of FILL_POLICIES
+
+    Returns:
+        np.ndarray: the same matrix
+    """
+    if policy == FILL_NAN:
+        return matrix
+    if policy == FILL_ZERO:
+        matrix[np.isnan(matrix)] = 0
+        return matrix
+    if policy not in FILL_POLICIES:
+        raise ValueError('Unknown fill policy: {}'.format(policy))
+
+    known = ~np.isnan(matrix)
+    columns = np.arange(matrix.shape[1])
+    rows = np.arange(matrix.shape[0])[:, None]
+    # Column of the last known value at or before each day, -1 if none yet
+    prev = np.maximum.accumulate(np.where(known, columns, -1), axis=1)
+    if policy == FILL_FORWARD:
+        filled = matrix[rows, np.maximum(prev, 0)]
+        filled[prev < 0] = np.nan
+        matrix[:] = filled
+        return matrix
+
+    # Column of the next known value at or after each day, n if none left
+    n = matrix.shape[1]
+    after = np.minimum.accumulate(np.where(known, columns, n)[:, ::-1], axis=1)[:, ::-1]
+    # Past either end, both sides are the nearest known value, so it is held flat
+    left = np.where(prev < 0, after, prev)
+    right = np.where(after >= n, prev, after)
+    empty = ~known.any(axis=1)
+    left[empty] = right[empty] = 0
+    weight = (columns - left) / np.maximum(right - left, 1)
+    weight[right == left] = 0
+    filled = matrix[rows, left] * (1 - weight) + matrix[rows, right] * weight
+    filled[empty] = np.nan
+    matrix[:] = filled
+    return matrix
+
+def to_dates(days):
+    """
+    Args:
+        days (np.ndarray): days since 1970-01-01
+
+    Returns:
+        list (str): YYYY-MM-DD
+    """
+    return [str(d) for d in np.asarray(days).astype('datetime64[D]')]
+
+class ColumnStore:
+    """
+    A columnar copy of each _scraped_data table for analytics, kept as .npy files
+    Per table: day (int32 days since 1970-01-01) and id (int32 code into the ids in meta.json)
+    arrays, and one float64 array per value column with NaN for NULL. Rows are sorted by day;
+    within a day they follow the id strings, while codes are handed out in the order ids were first seen.
+    Arrays are loaded memory-mapped, so readers share the page cache and copy nothing.
+    """
+    def __init__(self, columns_dir=COLUMNS_DIR):
+        """
+        Args:
+            columns_dir (str): folder holding one subfolder per table
+        """
+        self.columns_dir = columns_dir
+
+    def table_dir(self, table):
+        """
+        Args:
+            table (str): a key of TABLE_COLUMNS
+
+        Returns:
+            str: folder holding the table's arrays
+        """
+        return os.path.join(self.columns_dir, table)
+
+    def read_meta(self, table):
+        """
+        Args:
+            table (str): a key of TABLE_COLUMNS
+
+        Returns:
+            dict: version, rows, last_date and ids of the stored copy; None if never exported
+        """
+        path = os.path.join(self.table_dir(table), 'meta.json')
+        if not os.path.isfile(path):
+            return None
+        with open(path) as f:
+            return json.load(f)
+
+    def version(self, table):
+        """
+        Args:
+            table (str): a key of TABLE_COLUMNS
+
+        Returns:
+            int: bumped by every refresh that changed the table's copy, 0 if never exported
+        """
+        meta = self.read_meta(table)
+        return meta['version'] if meta else 0
+
+    def load(self, table):
+        """
+        Opens a table's arrays without reading them into memory
+
+        Args:
+            table (str): a key of TABLE_COLUMNS
+
+        Returns:
+            dict: 'day', 'id' and each value column -> read-only memmapped np.ndarray,
+                'ids' -> list of str decoding the id codes, 'version' -> int
+        """
+        meta = self.read_meta(table)
+        if meta is None:
+            raise ValueError('{} has not been exported to {}'.format(table, self.columns_dir))
+        id_column, value_columns = TABLE_COLUMNS[table]
+        columns = {'ids': meta['ids'], 'version': meta['version']}
+        for name in ['day', 'id'] + value_columns:
+            path = os.path.join(self.table_dir(table), name + '.npy')
+            # Empty arrays cannot be memory-mapped
+            columns[name] = np.load(path, mmap_mode='r') if meta['rows'] else np.load(path)
+        return columns
+
+    def matrix(self, table, columns, ids=None, start=None, end=None, fill=FILL_NAN):
+        """
+        Lays out values as one row per id and one column per day, without a Python loop over rows
+
+        Args:
+            table (str): a key of TABLE_COLUMNS
+            columns (list of str): value columns wanted
+            ids (list of str): row order; ids with no data get an empty row.
+                Defaults to every id with data in the window, sorted
+            start (str): first day, YYYY-MM-DD; defaults to the first stored day
+            end (str): last day, YYYY-MM-DD; defaults to the last stored day
+            fill (str): how days with no row are filled, one of FILL_POLICIES
+
+        Returns:
+            Series: ids, days and one matrix per column
+        """
+        stored = self.load(table)
+        day = stored['day']
+        first = to_days([start])[0] if start else (day[0] if len(day) else 0)
+        last = to_days([end])[0] if end else (day[-1] if len(day) else -1)
+        lo = int(np.searchsorted(day, first))
+        hi = int(np.searchsorted(day, last, side='right'))
+        offsets = np.asarray(day[lo:hi]) - first
+        codes = np.asarray(stored['id'][lo:hi])
+
+        if ids is None:
+            ids = sorted(stored['ids'][c] for c in np.unique(codes))
+        # Projects can share an id, so lay out each id once and repeat rows after
+        unique, repeat = np.unique(np.array(ids, dtype=object), return_inverse=True) if ids else ([], [])
+        known = {id: c for c, id in enumerate(stored['ids'])}
+        row_of_code = np.full(len(stored['ids']), -1, dtype=np.int64)
+        for row, id in enumerate(unique):
+            if id in known:
+                row_of_code[known[id]] = row
+        rows = row_of_code[codes]
+        wanted = rows >= 0
+
+        days = np.arange(first, last + 1).astype('datetime64[D]')
+        values = {}
+        for name in columns:
+            m = np.full((len(unique), len(days)), np.nan)
+            m[rows[wanted], offsets[wanted]] = np.asarray(stored[name][lo:hi])[wanted]
+            values[name] = fill_missing(m, fill)[repeat]
+        return Series(list(ids), days, values)
+
+    def refresh(self, dm, table, since=None):
+        """
+        Brings a table's copy up to date with the database
+        Only rows dated on or after `since` are read; stored rows from that day on are replaced
+
+        Args:
+            dm (DatabaseManager object): db handle to read from
+            table (str): a key of TABLE_COLUMNS
+            since (str): first day to re-read, YYYY-MM-DD; defaults to the last day
+                already stored, which may have been partial. Use '' to rebuild everything
+
+        Returns:
+            int: rows read from the database
+        """
+        id_column, value_columns = TABLE_COLUMNS[table]
+        meta = self.read_meta(table)
+        if meta is None:
+            since = ''
+        elif since is None:
+            since = meta['last_date']
+
+        rows = dm.get_scraped_rows(table, id_column, value_columns, since)
+        names = ['day', 'id'] + value_columns
+        if meta is None or since == '':
+            meta = {'version': meta['version'] if meta else 0, 'rows': 0, 'last_date': '', 'ids': []}
+            kept = {name: np.empty(0, np.int32 if name in ['day', 'id'] else np.float64) for name in names}
+            replaced = None
+        else:
+            stored = self.load(table)
+            cut = int(np.searchsorted(stored['day'], to_days([since])[0]))
+            kept = {name: stored[name][:cut] for name in names}
+            replaced = {name: stored[name][cut:] for name in names}
+
+        # Dictionary-encode ids, keeping the codes already handed out
+        codes = {id: i for i, id in enumerate(meta['ids'])}
+        new_ids = []
+        for row in rows:
+            if row[0] not in codes:
+                codes[row[0]] = len(codes)
+                new_ids.append(row[0])
+
+        new = {
+            'day': to_days([row[1] for row in rows]) if rows else np.empty(0, np.int32),
+            'id': np.array([codes[row[0]] for row in rows], dtype=np.int32),
+        }
+        values = np.array([row[2:] for row in rows], dtype=np.float64).reshape(len(rows), len(value_columns))
+        for i, name in enumerate(value_columns):
+            new[name] = values[:, i]
+
+        # Re-reading a day that has not changed leaves the version, and caches built on it, alone
+        if replaced is not None and not new_ids and all(
+                np.array_equal(replaced[name], new[name], equal_nan=True) for name in names):
+            return len(rows)
+
+        os.makedirs(self.table_dir(table), exist_ok=True)
+        for name in names:
+            path = os.path.join(self.table_dir(table), name + '.npy')
+            # Save then rename so readers never see a half-written array
+            with open(path + '.tmp', 'wb') as f:
+                np.save(f, np.concatenate([kept[name], new[name]]))
+            os.replace(path + '.tmp', path)
+
+        meta['version'] += 1
+        meta['rows'] = len(kept['day']) + len(rows)
+        meta['ids'] += new_ids
+        if rows:
+            meta['last_date'] = max(meta['last_date'], rows[-1][1])
+        path = os.path.join(self.table_dir(table), 'meta.json')
+        with open(path + '.tmp', 'w') as f:
+            json.dump(meta, f)
+        os.replace(path + '.tmp', path)
+        return len(rows)
+
+    def refresh_all(self, dm, since=None):
+        """
+        Refreshes every table in TABLE_COLUMNS, see refresh()
+
+        Args:
+            dm (DatabaseManager object): db handle to read from
+            since (str): first day to re-read, YYYY-MM-DD, optional
+
+        Returns:
+            dict: table -> rows read
+        """
+        return {table: self.refresh(dm, table, since) for table in TABLE_COLUMNS}
+
+if __name__ == '__main__':
+    # python ColumnStore.py [--full] : export or refresh every table
+    # Migrates the database first, since every exported table must exist
+    from DatabaseManager import DatabaseManager
+    DatabaseManager().close()
+    dm = DatabaseManager(readonly=True)
+    store = ColumnStore()
+    start = time.time()
+    counts = store.refresh_all(dm, '' if '--full' in sys.argv else None)
+    dm.close()
+    for table, count in counts.items():
+        print('{}: {} rows read, {} stored'.format(table, count, store.read_meta(table)['rows']))
+    print('Refreshed in {:.2f}s'.format(time.time() - start))
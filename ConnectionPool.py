@@ -0,0 +1,115 @@
+import os
+import sqlite3
+import threading
+from urllib.request import pathname2url
+
+WRITERS = 2             # daily_scrape holds one and its DatabaseWriter another; SQLite still commits one at a time
+READERS = 4             # read-only connections for analytics alongside scraping
+BUSY_TIMEOUT = 30       # seconds a connection waits on a lock before raising
+
+# Applied to every connection; WAL lets readers keep reading while a writer commits
+PRAGMAS = [
+    'PRAGMA synchronous = NORMAL;',     # safe with WAL, no fsync on every commit
+    'PRAGMA cache_size = -65536;',      # 64MB page cache
+    'PRAGMA mmap_size = 268435456;',    # read up to 256MB straight from the page cache
+    'PRAGMA temp_store = MEMORY;',
+]
+
+def connect(db_file, readonly=False):
+    """
+    Opens a tuned connection to a SQLite database
+
+    Args:
+        db_file (str): database file
+        readonly (bool): open with mode=ro, so the connection can never write
+
+    Returns:
+        sqlite3.Connection: connection in WAL mode with PRAGMAS applied
+    """
+    if readonly:
+        uri = 'file:{}?mode=ro'.format(pathname2url(os.path.abspath(db_file)))
+        conn = sqlite3.connect(uri, uri=True, timeout=BUSY_TIMEOUT, check_same_thread=False)
+    else:
+        conn = sqlite3.connect(db_file, timeout=BUSY_TIMEOUT, check_same_thread=False)
+        # Stored in the file, so later readers see WAL too
+        conn.execute('PRAGMA journal_mode = WAL;')
+    for pragma in PRAGMAS:
+        conn.execute(pragma)
+    return conn
+
+class ConnectionPool:
+    """
+    A fixed number of write and read-only connections shared between threads
+    Connections are handed out one caller at a time; when all are busy, callers wait
+    """
+    def __init__(self, db_file, writers=WRITERS, readers=READERS):
+        """
+        Args:
+            db_file (str): database file
+            writers (int): most write connections open at once
+            readers (int): most read-only connections open at once
+        """
+        self.db_file = db_file
+        self.limits = {False: writers, True: readers}
+        self.idle = {False: [], True: []}
+        self.open = {False: 0, True: 0}
+        self.modes = {}
+        self.closed = False
+        self.lock = threading.Condition()
+
+    def acquire(self, readonly=False):
+        """
+        Hands out an idle connection, opening a new one if the limit allows
+
+        Args:
+            readonly (bool): a read-only connection instead of a write connection
+
+        Returns:
+            sqlite3.Connection: a connection for the caller to use until release()
+        """
+        with self.lock:
+            while not self.idle[readonly] and self.open[readonly] >= self.limits[readonly]:
+                self.lock.wait()
+            if self.idle[readonly]:
+                return self.idle[readonly].pop()
+            self.open[readonly] += 1
+        try:
+            conn = connect(self.db_file, readonly)
+        except Exception:
+            with self.lock:
+                self.open[readonly] -= 1
+                self.lock.notify()
+            raise
+        with self.lock:
+            self.modes[conn] = readonly
+        return conn
+
+    def release(self, conn):
+        """
+        Returns a connection to the pool, rolling back anything left uncommitted
+
+        Args:
+            conn (sqlite3.Connection): connection obtained from acquire()
+        """
+        if conn.in_transaction:
+            conn.rollback()
+        with self.lock:
+            if not self.closed:
+                self.idle[self.modes[conn]].append(conn)
+                self.lock.notify()
+                return
+            self.open[self.modes.pop(conn)] -= 1
+        conn.close()
+
+    def close(self):
+        """
+        Closes every idle connection; connections still in use are closed on release
+        """
+        with self.lock:
+            self.closed = True
+            conns = self.idle[False] + self.idle[True]
+            self.idle = {False: [], True: []}
+            for conn in conns:
+                self.open[self.modes.pop(conn)] -= 1
+        for conn in conns:
+            conn.close()
@@ -0,0 +1,267 @@
+import glob
+import hashlib
+import json
+import os
+import sqlite3
+import sys
+import time
+from datetime import datetime
+
+# zstandard is optional; pages fall back to zlib if it is missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+import zlib
+
+BACKUP_DIR = './backup'
+BACKUP_PAGES = 256      # pages copied per step of the online backup, so writers are never held up for long
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+class DatabaseBackup:
+    """
+    Daily snapshots of the database, deduplicated page by page
+    Each snapshot is a consistent online copy taken with the SQLite backup API.
+    The copy is split into pages; only pages not stored by an earlier snapshot are
+    compressed into that day's pack in backup/packs/, and backup/index.db maps every
+    page hash to where it is packed. A manifest in backup/manifests/ lists the page
+    hashes in order, so any day is rebuilt by concatenating its pages.
+    Disk use and backup time follow what changed since the last snapshot, not database size.
+    """
+    def __init__(self, backup_dir=BACKUP_DIR):
+        """
+        Args:
+            backup_dir (str): folder holding the packs, index and manifests
+        """
+        self.backup_dir = backup_dir
+        self.packs_dir = os.path.join(backup_dir, 'packs')
+        self.manifests_dir = os.path.join(backup_dir, 'manifests')
+        os.makedirs(self.packs_dir, exist_ok=True)
+        os.makedirs(self.manifests_dir, exist_ok=True)
+
+        self.connection = sqlite3.connect(os.path.join(backup_dir, 'index.db'))
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS pages(
+                hash TEXT NOT NULL PRIMARY KEY,
+                pack TEXT NOT NULL,
+                offset INTEGER NOT NULL,
+                length INTEGER NOT NULL
+                );""")
+        self.connection.commit()
+
+    def manifest_path(self, name):
+        """
+        Args:
+            name (str): snapshot name, e.g. cherry_20220611
+
+        Returns:
+            str: where the snapshot's manifest lives
+        """
+        return os.path.join(self.manifests_dir, name + '.json')
+
+    def store_file(self, path, name):
+        """
+        Splits a database file into pages, packs the new ones and saves a manifest
+
+        Args:
+            path (str): a database file that nothing is writing to
+            name (str): snapshot name, e.g. cherry_20220611
+
+        Returns:
+            dict: the manifest, plus how many pages and compressed bytes were new
+        """
+        conn = sqlite3.connect(path)
+        page_size = conn.execute('PRAGMA page_size;').fetchone()[0]
+        conn.close()
+
+        known = {x[0] for x in self.connection.execute('SELECT hash FROM pages;')}
+        pages = []
+        new_pages = []
+        whole = hashlib.sha256()
+        pack_path = os.path.join(self.packs_dir, name + '.pack')
+        with open(path, 'rb') as f, open(pack_path, 'ab') as pack:
+            offset = pack.tell()
+            while True:
+                page = f.read(page_size)
+                if not page:
+                    break
+                whole.update(page)
+                digest = hashlib.sha256(page).hexdigest()
+                pages.append(digest)
+                if digest in known:
+                    continue
+                compressed = compress(page)
+                pack.write(compressed)
+                new_pages.append((digest, name, offset, len(compressed)))
+                known.add(digest)
+                offset += len(compressed)
+        if not os.path.getsize(pack_path):
+            os.remove(pack_path)
+
+        # Pages are only referenced once they are safely in the pack
+        self.connection.executemany('INSERT OR IGNORE INTO pages (hash, pack, offset, length) VALUES (?, ?, ?, ?);',
+            new_pages)
+        self.connection.commit()
+
+        manifest = {'name': name, 'created': datetime.now().isoformat(timespec='seconds'),
+            'page_size': page_size, 'size': page_size * len(pages), 'sha256': whole.hexdigest(), 'pages': pages}
+        tmp = self.manifest_path(name) + '.tmp'
+        with open(tmp, 'w') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_path(name))
+        return dict(manifest, new_pages=len(new_pages), new_bytes=sum(p[3] for p in new_pages))
+
+    def snapshot(self, db_file, name=None):
+        """
+        Takes a consistent copy of a live database and stores its changed pages
+
+        Args:
+            db_file (str): database to back up; may be in use by other connections
+            name (str): snapshot name, defaults to <db name>_<YYYYMMDD>
+
+        Returns:
+            dict: the manifest, plus how many pages and bytes were new
+        """
+        if name is None:
+            stem = os.path.splitext(os.path.basename(db_file))[0]
+            name = '{}_{}'.format(stem, datetime.now().strftime('%Y%m%d'))
+
+        tmp = os.path.join(self.backup_dir, name + '.db.tmp')
+        source = sqlite3.connect(db_file)
+        target = sqlite3.connect(tmp)
+        try:
+            source.backup(target, pages=BACKUP_PAGES)
+            # A single file, so the stored pages are the whole database
+            target.execute('PRAGMA journal_mode = DELETE;')
+        finally:
+            target.close()
+            source.close()
+        try:
+            return self.store_file(tmp, name)
+        finally:
+            os.remove(tmp)
+
+    def snapshots(self):
+        """
+        Returns:
+            list (str): names of every stored snapshot, oldest first
+        """
+        names = [os.path.basename(p)[:-len('.json')] for p in glob.glob(os.path.join(self.manifests_dir, '*.json'))]
+        return sorted(names)
+
+    def restore(self, name, out_file):
+        """
+        Rebuilds a snapshot into a database file and checks it against the manifest
+
+        Args:
+            name (str): snapshot name, e.g. cherry_20220611
+            out_file (str): file to write; it is replaced if it exists
+        """
+        with open(self.manifest_path(name)) as f:
+            manifest = json.load(f)
+        locations = {}
+        for digest, pack, offset, length in self.connection.execute('SELECT hash, pack, offset, length FROM pages;'):
+            locations[digest] = (pack, offset, length)
+
+        packs = {}
+        whole = hashlib.sha256()
+        tmp = out_file + '.tmp'
+        try:
+            with open(tmp, 'wb') as f:
+                for digest in manifest['pages']:
+                    pack, offset, length = locations[digest]
+                    if pack not in packs:
+                        packs[pack] = open(os.path.join(self.packs_dir, pack + '.pack'), 'rb')
+                    packs[pack].seek(offset)
+                    page = decompress(packs[pack].read(length))
+                    whole.update(page)
+                    f.write(page)
+        finally:
+            for pack in packs.values():
+                pack.close()
+        if whole.hexdigest() != manifest['sha256']:
+            os.remove(tmp)
+            raise RuntimeError('Snapshot {} does not match its manifest'.format(name))
+        os.replace(tmp, out_file)
+
+    def import_copies(self, pattern='*.db'):
+        """
+        Stores full database copies left in the backup folder by the old backup_db,
+        so they can be restored like any snapshot and the copies deleted
+
+        Args:
+            pattern (str): which files in the backup folder to import
+
+        Returns:
+            list (str): names of the snapshots imported
+        """
+        imported = []
+        for path in sorted(glob.glob(os.path.join(self.backup_dir, pattern))):
+            name = os.path.splitext(os.path.basename(path))[0]
+            if name != 'index' and not os.path.isfile(self.manifest_path(name)):
+                self.store_file(path, name)
+                imported.append(name)
+        return imported
+
+    def disk_usage(self):
+        """
+        Returns:
+            int: bytes used by the packs, index and manifests
+        """
+        total = os.path.getsize(os.path.join(self.backup_dir, 'index.db'))
+        for folder in [self.packs_dir, self.manifests_dir]:
+            total += sum(os.path.getsize(os.path.join(folder, f)) for f in os.listdir(folder))
+        return total
+
+    def close(self):
+        self.connection.close()
+
+def compress(page):
+    """
+    Args:
+        page (bytes): one database page
+
+    Returns:
+        bytes: the page compressed with zstandard, or zlib if it is missing
+    """
+    if zstandard is not None:
+        return b'Z' + zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(page)
+    return b'z' + zlib.compress(page, ZLIB_LEVEL)
+
+def decompress(data):
+    """
+    Args:
+        data (bytes): a page from compress()
+
+    Returns:
+        bytes: the page
+    """
+    if data[:1] == b'Z':
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to restore this snapshot')
+        return zstandard.ZstdDecompressor().decompress(data[1:])
+    return zlib.decompress(data[1:])
+
+if __name__ == '__main__':
+    # python DatabaseBackup.py snapshot [db_file]
+    # python DatabaseBackup.py restore <name> <out_file>
+    # python DatabaseBackup.py import
+    # python DatabaseBackup.py list
+    backups = DatabaseBackup()
+    command = sys.argv[1] if len(sys.argv) > 1 else 'list'
+    if command == 'snapshot':
+        from DatabaseManager import DB_FILE
+        start = time.time()
+        result = backups.snapshot(sys.argv[2] if len(sys.argv) > 2 else DB_FILE)
+        print('{}: {} pages, {} new ({} KB) in {:.2f}s'.format(result['name'], len(result['pages']),
+            result['new_pages'], result['new_bytes'] // 1024, time.time() - start))
+    elif command == 'restore':
+        backups.restore(sys.argv[2], sys.argv[3])
+    elif command == 'import':
+        for name in backups.import_copies():
+            print('Imported {}'.format(name))
+        print('{} KB in {}'.format(backups.disk_usage() // 1024, backups.backup_dir))
+    else:
+        for name in backups.snapshots():
+            print(name)
+    backups.close()
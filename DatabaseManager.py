@@ -5,83 +5,111 @@ no data should be removed
 master_ databases are meant to be an accurate upkept record;
 incorrect data should be removed or updated
 
-CREATE TABLE master_project_list(
-name TEXT NOT NULL PRIMARY KEY,
-release_date TEXT DEFAULT '',
-twitter_id TEXT DEFAULT '',
-discord_id TEXT DEFAULT '',
-quantity INTEGER,
-status TEXT,
-rank INTEGER);
-
-CREATE TABLE rarity_scraped_data(
-name TEXT NOT NULL,
-date TEXT NOT NULL,
-release_date TEXT,
-release_price REAL,
-presale_date TEXT,
-presale_price REAL,
-quantity INTEGER,
-currency TEXT,
-twitter_id TEXT,
-discord_id TEXT,
-website TEXT,
-PRIMARY KEY(name, date)
-);
-
-CREATE TABLE twitter_scraped_data(
-twitter_id TEXT NOT NULL,
-date TEXT NOT NULL,
-followers INTEGER,
-following INTEGER,
-activity INTEGER,
-PRIMARY KEY(twitter_id, date)
-);
-
-CREATE TABLE discord_scraped_data(
-discord_id TEXT NOT NULL,
-date TEXT NOT NULL,
-online INTEGER,
-members INTEGER,
-activity INTEGER,
-PRIMARY KEY(discord_id, date)
-);
-
-CREATE TABLE opensea_scraped_data(
-name TEXT NOT NULL,
-date TEXT NOT NULL,
-price REAL NOT NULL,
-highest_last_sale REAL,
-lowest_price REAL,
-);
-
-CREATE TABLE master_prediction_algorithms(
-
-);
+job_ databases are checkpoints for resuming an interrupted daily run
+
+The schema is owned by Migrations.py, applied when a DatabaseManager connects
 """
 
-import sqlite3
+import sys
+import time
 from sqlite3 import Error
 from datetime import date
 from dateutil.relativedelta import relativedelta
+from functools import lru_cache
+
+from ColumnStore import ColumnStore, FILL_NAN
+from ConnectionPool import connect
+from Migrations import migrate
+from Records import ProjectRecord, RarityRecord, TwitterRecord, DiscordRecord, OpenseaRecord
 
 DB_FILE = 'cherry.db'
 
+# The _scraped_data table each record type is entered into
+RECORD_TABLES = {
+    RarityRecord: 'rarity_scraped_data',
+    TwitterRecord: 'twitter_scraped_data',
+    DiscordRecord: 'discord_scraped_data',
+    OpenseaRecord: 'opensea_scraped_data',
+}
+
+@lru_cache(maxsize=None)
+def replace_sql(table, columns):
+    """
+    Builds a parameterized REPLACE statement once per table and column list
+    The identical text lets sqlite3 reuse its prepared statement on every call
+
+    Args:
+        table (str): table to enter into
+        columns (tuple of str): columns given a value, in parameter order
+
+    Returns:
+        str: the statement
+    """
+    return """REPLACE INTO {} ({})
+            VALUES ({})
+            ;""".format(table, ', '.join(columns), ', '.join('?' * len(columns)))
+
+@lru_cache(maxsize=None)
+def upsert_sql(table, key, columns):
+    """
+    Builds an INSERT ... ON CONFLICT DO UPDATE statement once per table and column list
+    Existing rows are updated in place, and only when a given column actually differs,
+    so unchanged rows are never rewritten
+
+    Args:
+        table (str): table to enter into
+        key (str): primary key column, which must be the first of columns
+        columns (tuple of str): columns given a value, in parameter order
+
+    Returns:
+        str: the statement
+    """
+    updates = [c for c in columns if c != key]
+    if not updates:
+        return """INSERT OR IGNORE INTO {} ({})
+            VALUES (?)
+            ;""".format(table, key)
+    return """INSERT INTO {} ({})
+            VALUES ({})
+            ON CONFLICT({}) DO UPDATE SET {}
+            WHERE {}
+            ;""".format(table, ', '.join(columns), ', '.join('?' * len(columns)), key,
+                ', '.join('{0} = excluded.{0}'.format(c) for c in updates),
+                ' OR '.join('{0} IS NOT excluded.{0}'.format(c) for c in updates))
+
 class DatabaseManager:
     """
     A handle to access and modify the cherry SQLite3 database
     """
-    def __init__(self):
+    def __init__(self, db_file=None, readonly=False, pool=None):
         """
         Creates a database connection to the cherry.db SQLite database
+
+        Args:
+            db_file (str): database to open instead of DB_FILE, optional
+            readonly (bool): use a read-only connection, for analytics running alongside scrapes
+            pool (ConnectionPool): borrow the connection from a pool instead of opening one, optional
         """
         conn = None
         try:
-            conn = sqlite3.connect(DB_FILE)
+            if pool:
+                conn = pool.acquire(readonly)
+            else:
+                conn = connect(db_file or DB_FILE, readonly)
         except Error as e:
             print(e)
+        self.pool = pool
+        self.readonly = readonly
         self.connection = conn
         self.cursor = self.connection.cursor()
+        if not readonly:
+            self.create_tables()
+
+    def create_tables(self):
+        """
+        Brings the schema up to date by applying any pending migrations
+        """
+        migrate(self.connection)
 
     def begin_transaction(self):
         """
@@ -89,47 +117,139 @@ class DatabaseManager:
         """
         self.cursor.execute('BEGIN TRANSACTION;')
 
+    def commit(self):
+        """
+        Commits everything entered so far and starts a new transaction
+        """
+        if self.connection.in_transaction:
+            self.cursor.execute('COMMIT;')
+        self.cursor.execute('BEGIN TRANSACTION;')
+
+    def abort_transaction(self):
+        """
+        Rolls back anything not yet committed and closes the database
+        """
+        self.connection.rollback()
+        self.close()
+
     def end_transaction(self):
         """
         Commits and closes the databsae
         """
         self.cursor.execute('COMMIT;')
-        self.connection.close()
+        self.close()
+
+    def close(self):
+        """
+        Closes the database, or hands the connection back to its pool
+        """
+        if self.pool:
+            self.pool.release(self.connection)
+        else:
+            self.connection.close()
 
-    def enter_project(self, data):
+    def enter_project(self, record):
         """
         Adds new data to a project in the master_project_list database
-        If data already exists on the project, it will be overwritten
+        If the project already exists, only columns with a new, different value are updated;
+        columns left as None (e.g. status and rank) keep what is stored
         
         Args:
-            data (dict): information to enter
+            record (ProjectRecord): information to enter
                 required fields:
                     -name
-                optional fields:
+                optional fields (None values are left out):
                     -release_date
                     -twitter_id
                     -discord_id
                     -quantity
                     -status
                     -rank
+
+        Returns:
+            dict: counts of inserted, updated and unchanged rows
         """
-        data = {k:v for k,v in data.items() if v}   # Remove empty values
-        columns = str(list(data.keys())).replace("'", "")[1:-1]
-        values = str(list(data.values()))[1:-1]
+        return self.enter_projects([record])
 
-        sql_replace = """REPLACE INTO master_project_list ({})
-                VALUES ({})
-                ;""".format(columns, values)
-        self.cursor.execute(sql_replace)
-        "COUNT"
+    def enter_projects(self, records):
+        """
+        Adds many projects to the master_project_list database, see enter_project()
+        Records with the same empty fields share one executemany
+
+        Args:
+            records (list of ProjectRecord): information to enter
+
+        Returns:
+            dict: counts of inserted, updated and unchanged rows
+        """
+        counts = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+        if not records:
+            return counts
+
+        self.stage_ids([r.name for r in records])
+        self.cursor.execute("""SELECT name FROM master_project_list
+                WHERE name IN (SELECT id FROM temp.staged_ids)
+                ;""")
+        existing = {x[0] for x in self.cursor.fetchall()}
+        counts['inserted'] = len({r.name for r in records} - existing)
+
+        groups = {}
+        for record in records:
+            columns = tuple(k for k, v in zip(record._fields, record) if v is not None)
+            groups.setdefault(columns, []).append([v for v in record if v is not None])
+        changed = 0
+        for columns, rows in groups.items():
+            self.cursor.executemany(upsert_sql('master_project_list', 'name', columns), rows)
+            changed += self.cursor.rowcount
+        counts['updated'] = changed - counts['inserted']
+        counts['unchanged'] = len(records) - changed
+        return counts
+
+    def enter_record(self, table, record):
+        """
+        Adds a record to a _scraped_data database, in the record's column order
+        If data already exists on the date/id, it will be overwritten
+
+        Args:
+            table (str): table to enter into
+            record (namedtuple): a record type from Records; None values are stored as NULL
+        """
+        self.cursor.execute(replace_sql(table, record._fields), record)
+
+    def enter_records(self, table, records):
+        """
+        Adds many records of one type to a _scraped_data database with a single executemany
 
-    def enter_rarity_record(self, data):
+        Args:
+            table (str): table to enter into
+            records (list of namedtuples): records of one type from Records
+        """
+        if records:
+            self.cursor.executemany(replace_sql(table, records[0]._fields), records)
+
+    def enter_many(self, records):
+        """
+        Adds a mix of record types, one executemany per type
+
+        Args:
+            records (list of namedtuples): records from Records, in any order
+        """
+        groups = {}
+        for record in records:
+            groups.setdefault(type(record), []).append(record)
+        for record_type, group in groups.items():
+            if record_type is ProjectRecord:
+                self.enter_projects(group)
+            else:
+                self.enter_records(RECORD_TABLES[record_type], group)
+
+    def enter_rarity_record(self, record):
         """
         Adds new data into the rarity_scraped_data database
         If data already exists on the date/name, it will be overwritten
 
         Args:
-            data (dict): information to enter
+            record (RarityRecord): information to enter
                 required fields: 
                     -date
                     -name
@@ -144,22 +264,15 @@ class DatabaseManager:
                     -discord_id
                     -website
         """
-        data = {k:v for k,v in data.items() if v}   # Remove empty values
-        columns = str(list(data.keys())).replace("'", "")[1:-1]
-        values = str(list(data.values()))[1:-1]
+        self.enter_record('rarity_scraped_data', record)
 
-        sql_replace = """REPLACE INTO rarity_scraped_data ({})
-                VALUES ({})
-                ;""".format(columns, values)
-        self.cursor.execute(sql_replace)
-
-    def enter_twitter_record(self, data):
+    def enter_twitter_record(self, record):
         """
         Adds new data into the twitter_scraped_data database
         If data already exists on the date/twitter_id, it will be overwritten
 
         Args:
-            data (dict): information to enter
+            record (TwitterRecord): information to enter
                 required fields: 
                     -date
                     -twitter_id
@@ -168,22 +281,15 @@ class DatabaseManager:
                     -following
                     -activity
         """
-        data = {k:v for k,v in data.items() if v}   # Remove empty values
-        columns = str(list(data.keys())).replace("'", "")[1:-1]
-        values = str(list(data.values()))[1:-1]
+        self.enter_record('twitter_scraped_data', record)
 
-        sql_replace = """REPLACE INTO twitter_scraped_data ({})
-                VALUES ({})
-                ;""".format(columns, values)
-        self.cursor.execute(sql_replace)
-
-    def enter_discord_record(self, data):
+    def enter_discord_record(self, record):
         """
         Adds new data into the discord_scraped_data database
-        If data already exists on the date/twitter_id, it will be overwritten
+        If data already exists on the date/discord_id, it will be overwritten
 
         Args:
-            data (dict): information to enter
+            record (DiscordRecord): information to enter
                 required fields: 
                     -date
                     -discord_id
@@ -192,38 +298,24 @@ class DatabaseManager:
                     -members
                     -activity
         """
-        data = {k:v for k,v in data.items() if v}   # Remove empty values
-        columns = str(list(data.keys())).replace("'", "")[1:-1]
-        values = str(list(data.values()))[1:-1]
-
-        sql_replace = """REPLACE INTO discord_scraped_data ({})
-                VALUES ({})
-                ;""".format(columns, values)
-        self.cursor.execute(sql_replace)
+        self.enter_record('discord_scraped_data', record)
 
-    def enter_opensea_record(self, data):
+    def enter_opensea_record(self, record):
         """
         Adds new data into the opensea_scraped_data database
         If data already exists on the date/name, it will be overwritten
 
         Args:
-            data (dict): information to enter
+            record (OpenseaRecord): information to enter
                 required fields: 
                     -date
                     -name
+                    -price
                 optional fields: 
-                    -online
-                    -members
-                    -activity
+                    -highest_last_sale
+                    -lowest_price
         """
-        data = {k:v for k,v in data.items() if v}   # Remove empty values
-        columns = str(list(data.keys())).replace("'", "")[1:-1]
-        values = str(list(data.values()))[1:-1]
-
-        sql_replace = """REPLACE INTO discord_scraped_data ({})
-                VALUES ({})
-                ;""".format(columns, values)
-        self.cursor.execute(sql_replace)
+        self.enter_record('opensea_scraped_data', record)
 
     def get_twitter_ids_pre_release(self, date):
         """
@@ -236,9 +328,9 @@ class DatabaseManager:
             list (str): all twitter_ids that meet search criteria
         """
         sql_filter = """SELECT twitter_id from master_project_list
-                WHERE release_date > date('{}')
-                ;""".format(date)
-        self.cursor.execute(sql_filter)
+                WHERE release_date > date(?)
+                ;"""
+        self.cursor.execute(sql_filter, (date,))
         ids = [x[0] for x in self.cursor.fetchall()]
         return ids
 
@@ -253,9 +345,9 @@ class DatabaseManager:
             list (str): all discord_ids that meet search criteria
         """
         sql_filter = """SELECT discord_id from master_project_list
-                WHERE release_date > date('{}')
-                ;""".format(date)
-        self.cursor.execute(sql_filter)
+                WHERE release_date > date(?)
+                ;"""
+        self.cursor.execute(sql_filter, (date,))
         ids = [x[0] for x in self.cursor.fetchall()]
         return ids
 
@@ -272,12 +364,25 @@ class DatabaseManager:
         MONTH_RANGE = 3
         start_date = date.today() - relativedelta(months =+ MONTH_RANGE)
         sql_filter = """SELECT name from master_project_list
-                WHERE release_date > date('{}') AND release_date < date('{}')
-                ;""".format(start_date, end_date)
-        self.cursor.execute(sql_filter)
+                WHERE release_date > date(?) AND release_date < date(?)
+                ;"""
+        self.cursor.execute(sql_filter, (str(start_date), end_date))
         names = [x[0] for x in self.cursor.fetchall()]
         return names
 
+    def stage_ids(self, ids):
+        """
+        Loads ids into the temp table staged_ids, replacing what was there
+        Lets a statement match any number of ids through an index instead of an inlined list
+
+        Args:
+            ids (list of str): ids to stage
+        """
+        self.cursor.execute('CREATE TEMP TABLE IF NOT EXISTS staged_ids(id TEXT PRIMARY KEY);')
+        self.cursor.execute('DELETE FROM temp.staged_ids;')
+        self.cursor.executemany('INSERT OR IGNORE INTO temp.staged_ids (id) VALUES (?);',
+            [(id,) for id in ids])
+
     def remove_twitter_ids(self, ids):
         """
         Removes a list of twitter_ids from the master_project_list
@@ -286,11 +391,18 @@ class DatabaseManager:
         Args:
             ids (list of str): twitter_ids to delete
         """
-        values = str(ids)[1:-1]
+        self.stage_ids(ids)
+        # Forget those projects' rarity fingerprints, so the next rarity scrape
+        # re-enters their listings and restores the id if the listing still has it
+        sql_forget = """DELETE FROM master_rarity_fingerprints
+                WHERE name IN (SELECT name FROM master_project_list
+                    WHERE twitter_id IN (SELECT id FROM temp.staged_ids))
+                ;"""
+        self.cursor.execute(sql_forget)
         sql_update = """UPDATE master_project_list
                 SET twitter_id = ''
-                WHERE twitter_id in ({})
-                ;""".format(values)
+                WHERE twitter_id IN (SELECT id FROM temp.staged_ids)
+                ;"""
         self.cursor.execute(sql_update)
 
     def remove_discord_ids(self, ids):
@@ -301,11 +413,18 @@ class DatabaseManager:
         Args:
             ids (list of str): discord_ids to delete
         """
-        values = str(ids)[1:-1]
+        self.stage_ids(ids)
+        # Forget those projects' rarity fingerprints, so the next rarity scrape
+        # re-enters their listings and restores the id if the listing still has it
+        sql_forget = """DELETE FROM master_rarity_fingerprints
+                WHERE name IN (SELECT name FROM master_project_list
+                    WHERE discord_id IN (SELECT id FROM temp.staged_ids))
+                ;"""
+        self.cursor.execute(sql_forget)
         sql_update = """UPDATE master_project_list
                 SET discord_id = ''
-                WHERE discord_id in ({})
-                ;""".format(values)
+                WHERE discord_id IN (SELECT id FROM temp.staged_ids)
+                ;"""
         self.cursor.execute(sql_update)
 
     def lookup_quantity(self, project):
@@ -325,3 +444,309 @@ class DatabaseManager:
         quantity = self.cursor.fetchall()[0][0]
 
         return quantity
+
+    def get_project_metadata(self, projects=None):
+        """
+        Looks up master_project_list data for many projects with a single query
+
+        Args:
+            projects (list of str): project names to keep, or None for every project
+
+        Returns:
+            dict: project name -> dict of release_date, twitter_id, discord_id, quantity, status, rank
+        """
+        fields = ['name', 'release_date', 'twitter_id', 'discord_id', 'quantity', 'status', 'rank']
+        sql_lookup = """SELECT {} FROM master_project_list
+                ;""".format(', '.join(fields))
+        self.cursor.execute(sql_lookup)
+
+        wanted = set(projects) if projects is not None else None
+        metadata = {}
+        for row in self.cursor.fetchall():
+            if wanted is None or row[0] in wanted:
+                metadata[row[0]] = dict(zip(fields[1:], row[1:]))
+        return metadata
+
+    def get_opensea_slugs(self):
+        """
+        Finds every known opensea collection slug
+
+        Returns:
+            dict: project name -> dict of slug, confidence, last_verified
+        """
+        sql_lookup = """SELECT name, slug, confidence, last_verified FROM master_opensea_slugs
+                ;"""
+        self.cursor.execute(sql_lookup)
+        slugs = {}
+        for name, slug, confidence, last_verified in self.cursor.fetchall():
+            slugs[name] = {'slug': slug, 'confidence': confidence, 'last_verified': last_verified}
+        return slugs
+
+    def enter_opensea_slug(self, data):
+        """
+        Adds or updates a project's collection slug in the master_opensea_slugs database
+
+        Args:
+            data (dict): information to enter
+                required fields:
+                    -name
+                    -slug
+                    -confidence
+                    -last_verified
+        """
+        sql_replace = """REPLACE INTO master_opensea_slugs (name, slug, confidence, last_verified)
+                VALUES (?, ?, ?, ?)
+                ;"""
+        self.cursor.execute(sql_replace, (data['name'], data['slug'], data['confidence'], data['last_verified']))
+
+    def get_rarity_fingerprints(self):
+        """
+        Finds the fingerprint of every rarity listing seen so far
+
+        Returns:
+            dict: project name -> dict of fingerprint, cells (json text of the raw cells)
+        """
+        sql_lookup = """SELECT name, fingerprint, cells FROM master_rarity_fingerprints
+                ;"""
+        self.cursor.execute(sql_lookup)
+        return {name: {'fingerprint': f, 'cells': cells} for name, f, cells in self.cursor.fetchall()}
+
+    def enter_rarity_fingerprint(self, data):
+        """
+        Adds or updates a listing's fingerprint in the master_rarity_fingerprints database
+
+        Args:
+            data (dict): information to enter
+                required fields:
+                    -name
+                    -fingerprint
+                    -cells
+                    -last_changed
+        """
+        sql_replace = """REPLACE INTO master_rarity_fingerprints (name, fingerprint, cells, last_changed)
+                VALUES (?, ?, ?, ?)
+                ;"""
+        self.cursor.execute(sql_replace, (data['name'], data['fingerprint'], data['cells'], data['last_changed']))
+
+    def get_active_algorithms(self):
+        """
+        Finds the prediction algorithms still being trained
+
+        Returns:
+            list (str): names of algorithms with status active
+        """
+        sql_lookup = """SELECT name FROM master_prediction_algorithms
+                WHERE status = 'active'
+                ;"""
+        self.cursor.execute(sql_lookup)
+        return [x[0] for x in self.cursor.fetchall()]
+
+    def enter_algorithms(self, names):
+        """
+        Adds prediction algorithms to the master_prediction_algorithms database as active
+        Algorithms already there keep their status, so retired ones stay retired
+
+        Args:
+            names (list of str): algorithm names
+        """
+        sql_insert = """INSERT OR IGNORE INTO master_prediction_algorithms (name)
+                VALUES (?)
+                ;"""
+        self.cursor.executemany(sql_insert, [(name,) for name in names])
+
+    def enter_algorithm_results(self, results, date):
+        """
+        Records how well each algorithm scored, replacing its previous result
+
+        Args:
+            results (dict): algorithm name -> (accuracy, number of projects scored)
+            date (str): day trained, YYYY-MM-DD
+        """
+        sql_update = """UPDATE master_prediction_algorithms
+                SET accuracy = ?, projects = ?, last_trained = ?
+                WHERE name = ?
+                ;"""
+        self.cursor.executemany(sql_update,
+            [(accuracy, projects, date, name) for name, (accuracy, projects) in results.items()])
+
+    def carry_forward_rarity_records(self, names, date):
+        """
+        Copies each project's latest rarity_scraped_data row to a new date
+        Used for listings that have not changed, so they do not need to be parsed again
+        Rows already on the new date are kept, so a resumed run never overwrites fresh data
+
+        Args:
+            names (list of str): projects to copy
+            date (str): date to copy the rows to
+        """
+        sql_copy = """INSERT OR IGNORE INTO rarity_scraped_data (name, date, release_date, release_price,
+                    presale_date, presale_price, quantity, currency, twitter_id, discord_id, website)
+                SELECT name, ?, release_date, release_price,
+                    presale_date, presale_price, quantity, currency, twitter_id, discord_id, website
+                FROM rarity_scraped_data
+                WHERE name = ? AND date = (
+                    SELECT MAX(date) FROM rarity_scraped_data WHERE name = ? AND date < ?)
+                ;"""
+        self.cursor.executemany(sql_copy, [(date, name, name, date) for name in names])
+
+    def get_scraped_rows(self, table, id_column, columns, since=''):
+        """
+        Reads a _scraped_data table from a day on, for the column store
+
+        Args:
+            table (str): _scraped_data table to read
+            id_column (str): the table's id column, e.g. twitter_id
+            columns (list of str): value columns to read
+            since (str): first day to read, YYYY-MM-DD; '' reads everything
+
+        Returns:
+            list of tuples: id, date, then each value column, ordered by date and id
+        """
+        sql_lookup = """SELECT {0}, date, {1} FROM {2}
+                WHERE date >= ?
+                ORDER BY date, {0}
+                ;""".format(id_column, ', '.join(columns), table)
+        self.cursor.execute(sql_lookup, (since,))
+        return self.cursor.fetchall()
+
+    def get_series(self, table, columns, ids=None, start=None, end=None, fill=FILL_NAN, store=None):
+        """
+        Reads history as day-indexed NumPy matrices, one row per id, in one call
+        The column store is first brought up to date, then sliced without reading rows one by one
+
+        Args:
+            table (str): _scraped_data table, a key of ColumnStore.TABLE_COLUMNS
+            columns (list of str): value columns wanted, e.g. ['followers', 'following']
+            ids (list of str): the table's ids, in the row order wanted; defaults to every id with data
+            start (str): first day, YYYY-MM-DD, optional
+            end (str): last day, YYYY-MM-DD, optional
+            fill (str): how missing days are filled, one of ColumnStore.FILL_POLICIES
+            store (ColumnStore): column store to read, defaults to ./columns
+
+        Returns:
+            Series: ids, days (datetime64[D]) and column -> np.ndarray of shape (ids, days)
+        """
+        store = store or ColumnStore()
+        store.refresh(self, table)
+        return store.matrix(table, columns, ids, start, end, fill)
+
+    def get_finished_ids(self, run_date, stage):
+        """
+        Finds the ids a stage of a daily run has already finished
+
+        Args:
+            run_date (str): day of the run, YYYY-MM-DD
+            stage (str): scrape stage, e.g. 'twitter'
+
+        Returns:
+            set (str): ids checkpointed in job_progress
+        """
+        sql_lookup = """SELECT id FROM job_progress
+                WHERE run_date = ? AND stage = ?
+                ;"""
+        self.cursor.execute(sql_lookup, (run_date, stage))
+        return {x[0] for x in self.cursor.fetchall()}
+
+    def enter_finished_ids(self, run_date, stage, ids):
+        """
+        Checkpoints ids a stage has finished; they are only durable once committed
+
+        Args:
+            run_date (str): day of the run, YYYY-MM-DD
+            stage (str): scrape stage, e.g. 'twitter'
+            ids (list of str): ids to mark as finished
+        """
+        sql_insert = """INSERT OR IGNORE INTO job_progress (run_date, stage, id)
+                VALUES (?, ?, ?)
+                ;"""
+        self.cursor.executemany(sql_insert, [(run_date, stage, id) for id in ids])
+
+    def stage_finished(self, run_date, stage):
+        """
+        Args:
+            run_date (str): day of the run, YYYY-MM-DD
+            stage (str): scrape stage, e.g. 'twitter'
+
+        Returns:
+            bool: True if the stage already ran to the end for this day
+        """
+        sql_lookup = """SELECT 1 FROM job_stages
+                WHERE run_date = ? AND stage = ? AND finished IS NOT NULL
+                ;"""
+        self.cursor.execute(sql_lookup, (run_date, stage))
+        return self.cursor.fetchone() is not None
+
+    def finish_stage(self, run_date, stage):
+        """
+        Marks a stage of a daily run as done, so a resumed run skips it
+
+        Args:
+            run_date (str): day of the run, YYYY-MM-DD
+            stage (str): scrape stage, e.g. 'twitter'
+        """
+        sql_replace = """REPLACE INTO job_stages (run_date, stage, finished)
+                VALUES (?, ?, datetime('now'))
+                ;"""
+        self.cursor.execute(sql_replace, (run_date, stage))
+
+    def clear_finished_ids(self, run_date):
+        """
+        Drops the per-id checkpoints of a run once every stage has finished
+
+        Args:
+            run_date (str): day of the run, YYYY-MM-DD
+        """
+        sql_delete = """DELETE FROM job_progress
+                WHERE run_date = ?
+                ;"""
+        self.cursor.execute(sql_delete, (run_date,))
+
+def benchmark(db_file=DB_FILE, rows=20000):
+    """
+    Times entering twitter records one formatted statement per row (the old way),
+    one parameterized execute per row, and one executemany; nothing is kept
+
+    Args:
+        db_file (str): database to run against; every insert is rolled back
+        rows (int): records entered by each method
+
+    Returns:
+        dict: method -> rows per second
+    """
+    records = [TwitterRecord('bench_{}'.format(i), '9999-12-31', i, i // 2, None) for i in range(rows)]
+    dm = DatabaseManager(db_file)
+
+    def formatted(records):
+        for r in records:
+            data = {k:v for k,v in r._asdict().items() if v}
+            columns = str(list(data.keys())).replace("'", "")[1:-1]
+            values = str(list(data.values()))[1:-1]
+            dm.cursor.execute("""REPLACE INTO twitter_scraped_data ({})
+                VALUES ({})
+                ;""".format(columns, values))
+
+    def single(records):
+        for r in records:
+            dm.enter_twitter_record(r)
+
+    def bulk(records):
+        dm.enter_records('twitter_scraped_data', records)
+
+    results = {}
+    for name, enter in [('formatted execute', formatted), ('parameterized execute', single), ('executemany', bulk)]:
+        dm.begin_transaction()
+        start = time.perf_counter()
+        enter(records)
+        results[name] = rows / (time.perf_counter() - start)
+        dm.connection.rollback()
+    dm.close()
+    return results
+
+if __name__ == '__main__':
+    # python DatabaseManager.py [db_file] [rows]
+    db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    rows = int(sys.argv[2]) if len(sys.argv) > 2 else 20000
+    results = benchmark(db_file, rows)
+    slowest = min(results.values())
+    for name, rate in results.items():
+        print('{:>22}: {:>9.0f} rows/s  ({:.1f}x)'.format(name, rate, rate / slowest))
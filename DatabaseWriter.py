@@ -0,0 +1,152 @@
+import queue
+import threading
+import time
+
+from DatabaseManager import DatabaseManager
+
+LOGGING = False
+
+QUEUE_SIZE = 1000       # records waiting to be written before scrapers are made to wait
+FLUSH_SIZE = 100        # records written per commit
+FLUSH_SECONDS = 5       # longest a record waits before it is committed
+
+class DatabaseWriter:
+    """
+    Writes records to the database from a background thread while scrapers keep running
+    Scrapers append records to a bounded queue; the writer commits them every
+    FLUSH_SIZE records or FLUSH_SECONDS, whichever comes first, on its own connection.
+    Any other connection must not hold uncommitted writes while the writer is open.
+    """
+    def __init__(self, queue_size=QUEUE_SIZE, flush_size=FLUSH_SIZE, flush_seconds=FLUSH_SECONDS, progress=None, pool=None):
+        """
+        Args:
+            queue_size (int): records to hold before append() blocks
+            flush_size (int): records written per commit
+            flush_seconds (float): longest a record waits before it is committed
+            progress (tuple of str): run_date, stage; if given, each record's id is
+                checkpointed in job_progress in the same commit as the record
+            pool (ConnectionPool): where to borrow the writer's connection from, optional
+        """
+        self.queue = queue.Queue(maxsize=queue_size)
+        self.flush_size = flush_size
+        self.flush_seconds = flush_seconds
+        self.progress = progress
+        self.pool = pool
+        self.written = 0
+        self.flushes = 0
+        self.error = None
+        self.thread = threading.Thread(target=self.run, daemon=True)
+        self.thread.start()
+
+    def append(self, record):
+        """
+        Queues a record to be written; blocks while the queue is full
+
+        Args:
+            record (namedtuple): a record type from Records
+        """
+        self.queue.put(record)
+
+    def run(self):
+        """
+        Writer thread: collects queued records and commits them in batches until close()
+        Any error is kept for close() to raise, and the queue is still drained to the end,
+        so scrapers blocked in append() are never left waiting on a dead thread
+        """
+        dm = None
+        try:
+            dm = DatabaseManager(pool=self.pool)
+            dm.begin_transaction()
+            self.write(dm)
+        except Exception as e:
+            self.fail(e, 'Could not run the database writer')
+            while self.queue.get() is not None:
+                pass
+        if dm is None:
+            return
+        try:
+            if self.error:
+                dm.abort_transaction()
+            else:
+                dm.end_transaction()
+        except Exception as e:
+            self.fail(e, 'Could not close the database writer')
+
+    def write(self, dm):
+        """
+        Collects queued records and commits them in batches until the None sent by close()
+
+        Args:
+            dm (DatabaseManager object): the writer thread's own db handle
+        """
+        batch = []
+        deadline = time.time() + self.flush_seconds
+        while True:
+            try:
+                record = self.queue.get(timeout=max(0, deadline - time.time()))
+            except queue.Empty:
+                record = False
+            if record:
+                batch.append(record)
+            if batch and (record is None or len(batch) >= self.flush_size or time.time() >= deadline):
+                self.flush(dm, batch)
+                batch = []
+            if record is None:
+                break
+            if not batch:
+                deadline = time.time() + self.flush_seconds
+
+    def flush(self, dm, batch):
+        """
+        Enters and commits one batch of records
+        A batch that fails is rolled back whole, so no record is kept without its checkpoint
+
+        Args:
+            dm (DatabaseManager object): the writer thread's own db handle
+            batch (list of namedtuples): records to write
+        """
+        if self.error:
+            return
+        try:
+            dm.enter_many(batch)
+            if self.progress:
+                # The first field of every record is its id
+                dm.enter_finished_ids(*self.progress, [r[0] for r in batch])
+            dm.commit()
+        except Exception as e:
+            # Keep draining the queue so scrapers never block; close() reports the error
+            self.fail(e, 'Could not write {} records'.format(len(batch)))
+            try:
+                dm.connection.rollback()
+            except Exception as e:
+                self.fail(e, 'Could not roll back the failed batch')
+            return
+        self.written += len(batch)
+        self.flushes += 1
+        if LOGGING:
+            print('\nWrote {} records ({} total)'.format(len(batch), self.written))
+
+    def fail(self, error, message):
+        """
+        Keeps the first error for close() to raise
+
+        Args:
+            error (Exception): what went wrong
+            message (str): printed with the error
+        """
+        if self.error is None:
+            self.error = error
+        print('\nError: {}: {}'.format(message, error))
+
+    def close(self):
+        """
+        Writes whatever is still queued and stops the writer thread
+
+        Returns:
+            int: records written
+        """
+        self.queue.put(None)
+        self.thread.join()
+        if self.error:
+            raise self.error
+        return self.written
@@ -1,41 +1,66 @@
 import sys
 import re
-import time
+from datetime import date
 
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.common.exceptions import TimeoutException, WebDriverException
+
+from BrowserProfile import DEFAULT_PROFILE
+from BrowserSession import new_driver
+from HtmlParser import parse, only
+from PageReadiness import READINESS
+from Records import DiscordRecord
+from RetryQueue import RetryQueue, LOAD_FAILURE, TIMEOUT, PARSE_FAILURE, NOT_FOUND
 
 MEMBERS_DIV_CLASS = "activityCount-2n5Mj9"
 LOGGING = False
 WAIT_TIME = 3
+SOUP_STRAINER = only("div", MEMBERS_DIV_CLASS)
 ATTEMPTS = 2
+MISSING_ACCOUNT_TEXT = ["Invite Invalid", "This invite may be expired"]
 
 class DiscordScraper:
     """
     An object to collect data from a discord user page
     For now, this just includes number of followers
     """
-    def __init__(self, users):
+    def __init__(self, users, profile=DEFAULT_PROFILE, session=None, archive=None, sink=None):
         self.users = users
+        self.profile = profile
+        self.session = session
+        self.archive = archive
+        self.date = date.today().strftime('%Y-%m-%d')
+        self.label = ''
         self.current_user = None
         self.soup = None
-        self.data = []
+        # Records go straight to a DatabaseWriter when one is given
+        self.data = [] if sink is None else sink
+        self.failure_reasons = {}
 
     def open_chrome(self):
         """
         Open up a virtual Chrome browser
+        Borrows a warm browser from the session if one was given
+        """
+        if self.session:
+            self.driver = self.session.acquire()
+        else:
+            self.driver = new_driver(self.profile)
+
+    def close_chrome(self):
+        """
+        Close the virtual Chrome browser, or hand it back to the session
         """
-        self.driver = webdriver.Chrome(ChromeDriverManager().install())
-        print('====== CherryJam driving ======')
+        if self.session:
+            self.session.release(self.driver)
+        else:
+            self.driver.quit()
 
     def retrieve_url(self, user):
         """
         Open a url on the virtual Chrome browser
+
+        Returns:
+            bool: True if the url was opened
         """
         url =  "https://discord.com/invite/{}".format(user)
         try:
@@ -44,35 +69,45 @@ class DiscordScraper:
             error = '\n{}\nError: Could not retrieve the url: {}'.format(self.current_user, url)
             if LOGGING: 
                 print(error)
+            return False
+        return True
 
     def load_wait(self):
         """
         Wait for the page to load
+
+        Returns:
+            bool: True if the page loaded in time
         """
-        try:
-            WebDriverWait(self.driver, WAIT_TIME).until(
-                EC.presence_of_element_located((By.CLASS_NAME, MEMBERS_DIV_CLASS))
-            )
-        except TimeoutException:
+        # Users that keep failing are removed from the project list, so never wait less than WAIT_TIME
+        ready = READINESS.wait_for(self.driver, 'discord', (By.CLASS_NAME, MEMBERS_DIV_CLASS), WAIT_TIME,
+            keep_default=True)
+        if not ready:
             error = '\n{}\nError: Website not loaded or account not found'.format(self.current_user)
             if LOGGING:
                 print(error)
-        except WebDriverException:
-            error = '\n{}\nError: Selenium cannot determine loading status. Manually waiting.'.format(self.current_user)       
-            if LOGGING:
-                print(error)
-            time.sleep(WAIT_TIME)
+        return ready
 
     def make_soup(self):
         """
-        Get the current html
+        Get the current html, archiving it if an archive was given
+        Only the elements we read are parsed; the soup is empty if they are missing
         """
         html = self.driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-        if soup:
-            self.soup = soup
-        else:
-            error = '\n{}\nError: Could not get current html'.format(self.current_user)
+        if self.archive:
+            self.archive.store('discord', self.current_user, self.date, html)
+        self.read_html(html)
+
+    def read_html(self, html):
+        """
+        Parse page html, from the live browser or from the page archive
+
+        Args:
+            html (str): page source
+        """
+        self.soup = parse(html, SOUP_STRAINER, 'discord')
+        if not self.soup:
+            error = '\n{}\nError: Could not find members in the current html'.format(self.current_user)
             if LOGGING:
                 print(error)
 
@@ -116,6 +151,16 @@ class DiscordScraper:
             print(error)
         return online, total
 
+    def account_missing(self):
+        """
+        Checks whether the page says the invite does not exist
+
+        Returns:
+            bool: True if retrying this user is pointless
+        """
+        xpath = ' | '.join('//*[contains(text(), "{}")]'.format(t) for t in MISSING_ACCOUNT_TEXT)
+        return len(self.driver.find_elements(By.XPATH, xpath)) > 0
+
     def calculate_activity_score(self):
         """
         Attempts to quantify the activity / community / life displayed on the profile
@@ -130,46 +175,69 @@ class DiscordScraper:
             pass
         return score
 
-    def traverse_batch(self, batch):
+    def scrape_user(self, user):
         """
-        Iterates through a list of users: loads each webpage, gathers html, and records followers data
+        Loads one user's webpage, gathers html, and records members data
 
         Args:
-            batch (list[str]): usernames to run
+            user (str): username to run
 
         Returns:
-            list[str]: usernames that failed
+            str: reason the attempt failed (see RetryQueue), or None on success
         """
-        failures = []
+        # Load the webpage
+        self.current_user = user
+        if not self.retrieve_url(self.current_user):
+            return LOAD_FAILURE
+        ready = self.load_wait()
+        self.make_soup()
 
-        for i, user in enumerate(batch):
-            # Load the webpage
-            i += 1
-            self.current_user = user
-            self.retrieve_url(self.current_user)
-            self.load_wait()
-            self.make_soup()
+        # Gather member data
+        online, total = self.get_members()
+        if online > -1 and total > -1:
+            # Gather activity data
+            activity = self.calculate_activity_score()
 
-            # Gather member data
-            online, total = self.get_members()
-            if online > -1 and total > -1:
-                user_data = {'discord_id': user, 'online': online, 'members':total}
+            self.data.append(DiscordRecord(user, self.date, online, total,
+                activity if activity > -1 else None))
+            return None
 
-                # Gather activity data
-                activity = self.calculate_activity_score()
-                if activity > -1:
-                    user_data['activity'] = activity
+        if self.account_missing():
+            return NOT_FOUND
+        if not ready:
+            return TIMEOUT
+        return PARSE_FAILURE
 
-                self.data.append(user_data)
+    def traverse_batch(self, batch, tries=ATTEMPTS):
+        """
+        Iterates through a list of users, retrying failures with backoff while fresh users keep running
+
+        Args:
+            batch (list[str]): usernames to run
+            tries (int): number of times to load each user in case of failure
+
+        Returns:
+            list[str]: usernames that failed
+        """
+        queue = RetryQueue(batch, tries)
+
+        user = queue.pop()
+        while user is not None:
+            reason = self.scrape_user(user)
+            if reason:
+                queue.failed(user, reason)
             else:
-                failures.append(user)
+                queue.succeeded(user)
 
-            sys.stdout.write('\r[{}/{}]'.format(i, len(batch)))
+            sys.stdout.write('\r{}[{}/{}]'.format(self.label, queue.done, queue.total))
             sys.stdout.flush()
+            user = queue.pop()
 
-        print('\nThis batch had {} successes and {} failures. Failure list:'.format( len(batch)-len(failures) , len(failures) ))
+        failures = queue.failures
+        self.failure_reasons.update({f: queue.reasons[f] for f in failures})
+        print('\n{}This batch had {} successes and {} failures. Failure list:'.format(self.label, len(batch)-len(failures) , len(failures) ))
         for f in failures:
-            print(f)
+            print('{} ({})'.format(f, ', '.join(queue.reasons[f])))
         return failures
 
     def batch_scrape(self, tries=ATTEMPTS):
@@ -183,20 +251,14 @@ class DiscordScraper:
             list (str): users that failed after all tries
         """
         self.open_chrome()
-
-        todo = self.users
-        for i in range(tries):
-            print('\nATTEMPT #{}'.format(i+1))
-            todo = self.traverse_batch(todo)
-
-        self.driver.quit()
-        failures = todo
+        failures = self.traverse_batch(self.users, tries)
+        self.close_chrome()
         return failures
 
     def dump_data(self):
         """
         Returns:
-            list of dicts: all scraped data
+            list of records: all scraped data, or the sink they were sent to
 
         """
         return self.data
\ No newline at end of file
@@ -0,0 +1,285 @@
+import hashlib
+import json
+import os
+import shutil
+import time
+from collections import namedtuple
+
+import numpy as np
+
+from ColumnStore import ColumnStore, FILL_FORWARD, to_dates
+
+FEATURES_DIR = './features'
+WINDOWS = [3, 7, 14]        # days each windowed feature is computed over
+LIFE_SCORE_WINDOW = 7       # days the life scores look back over
+MAX_CACHED = 4              # feature caches kept on disk, newest first
+
+# twitter_life_score: followers gained per day over LIFE_SCORE_WINDOW, as a percent of followers
+# discord_life_score: percent of members online, averaged over LIFE_SCORE_WINDOW,
+#   plus members gained per day over the same window as a percent of members
+LIFE_SCORES = ['twitter_life_score', 'discord_life_score']
+
+# projects: row labels; days: np.ndarray of datetime64[D]; names: feature names;
+# values: np.ndarray of shape (len(names), len(projects), len(days)), memory-mapped when cached
+Features = namedtuple('Features', ['projects', 'days', 'names', 'values'])
+
+def feature_names(windows=WINDOWS):
+    """
+    Args:
+        windows (list of int): window lengths in days
+
+    Returns:
+        list (str): names of every feature computed, in the order they are stored
+    """
+    names = []
+    for w in windows:
+        for series in ['followers', 'members']:
+            names += ['{}_growth_{}'.format(series, w), '{}_slope_{}'.format(series, w), '{}_accel_{}'.format(series, w)]
+        names.append('online_ratio_{}'.format(w))
+    return names + LIFE_SCORES
+
+def pad_front(values, days):
+    """
+    Args:
+        values (np.ndarray): one row per project, one column per day at the end of the range
+        days (int): length of the full range
+
+    Returns:
+        np.ndarray: values right-aligned to the range, NaN for days without enough history
+    """
+    out = np.full((values.shape[0], days), np.nan)
+    if values.shape[1]:
+        out[:, days - values.shape[1]:] = values
+    return out
+
+def difference(series, window):
+    """
+    Args:
+        series (np.ndarray): one row per project, one column per day
+        window (int): days to look back
+
+    Returns:
+        np.ndarray: change from `window` days before, per day
+    """
+    before = series[:, :-window] if window < series.shape[1] else series[:, :0]
+    return pad_front(series[:, window:] - before, series.shape[1])
+
+def growth(series, window):
+    """
+    Args:
+        series (np.ndarray): one row per project, one column per day
+        window (int): days to look back
+
+    Returns:
+        np.ndarray: fractional change from `window` days before, per day
+    """
+    before = pad_front(series[:, :-window] if window < series.shape[1] else series[:, :0], series.shape[1])
+    with np.errstate(divide='ignore', invalid='ignore'):
+        return difference(series, window) / np.where(before == 0, np.nan, before)
+
+def slope(series, window):
+    """
+    Least squares slope of each trailing window, computed for every day at once
+
+    Args:
+        series (np.ndarray): one row per project, one column per day
+        window (int): days in each fit, at least 2
+
+    Returns:
+        np.ndarray: change per day over the window ending on each day
+    """
+    if window > series.shape[1]:
+        return np.full(series.shape, np.nan)
+    x = np.arange(window) - (window - 1) / 2
+    windows = np.lib.stride_tricks.sliding_window_view(series, window, axis=1)
+    return pad_front(windows @ (x / (x ** 2).sum()), series.shape[1])
+
+def acceleration(series, window):
+    """
+    Args:
+        series (np.ndarray): one row per project, one column per day
+        window (int): days in each slope fit, and between the two fits compared
+
+    Returns:
+        np.ndarray: change in slope per day
+    """
+    return difference(slope(series, window), window) / window
+
+def rolling_mean(series, window):
+    """
+    Args:
+        series (np.ndarray): one row per project, one column per day
+        window (int): days averaged
+
+    Returns:
+        np.ndarray: mean of the trailing window ending on each day
+    """
+    if window > series.shape[1]:
+        return np.full(series.shape, np.nan)
+    return pad_front(np.lib.stride_tricks.sliding_window_view(series, window, axis=1).mean(axis=2), series.shape[1])
+
+def compute_features(followers, online, members, windows=WINDOWS):
+    """
+    Computes every feature for every project and day with whole-array operations
+
+    Args:
+        followers (np.ndarray): twitter followers, one row per project, one column per day
+        online (np.ndarray): discord members online, same shape
+        members (np.ndarray): discord members, same shape
+        windows (list of int): window lengths in days
+
+    Returns:
+        np.ndarray: shape (len(feature_names(windows)), projects, days)
+    """
+    with np.errstate(divide='ignore', invalid='ignore'):
+        ratio = online / np.where(members == 0, np.nan, members)
+        follower_level = np.where(followers == 0, np.nan, followers)
+        member_level = np.where(members == 0, np.nan, members)
+    features = []
+    for w in windows:
+        for series in [followers, members]:
+            features += [growth(series, w), slope(series, w), acceleration(series, w)]
+        features.append(rolling_mean(ratio, w))
+
+    with np.errstate(divide='ignore', invalid='ignore'):
+        twitter_life_score = 100 * slope(followers, LIFE_SCORE_WINDOW) / follower_level
+        discord_life_score = 100 * (rolling_mean(ratio, LIFE_SCORE_WINDOW)
+            + slope(members, LIFE_SCORE_WINDOW) / member_level)
+    features += [twitter_life_score, discord_life_score]
+    return np.stack(features)
+
+class FeatureEngine:
+    """
+    Twitter and discord features for many projects at once, cached on disk per data version
+    A cache is keyed by the column store versions of the tables read, so it is reused
+    until a scrape changes them. Cached values are memory-mapped, so processes reading
+    the same cache share one copy.
+    """
+    def __init__(self, store=None, features_dir=FEATURES_DIR, windows=WINDOWS):
+        """
+        Args:
+            store (ColumnStore): column store to read, defaults to ./columns
+            features_dir (str): folder holding one subfolder per cached feature set
+            windows (list of int): window lengths in days
+        """
+        self.store = store or ColumnStore()
+        self.features_dir = features_dir
+        self.windows = windows
+        self.names = feature_names(windows)
+
+    def cache_key(self, projects, ids, end):
+        """
+        Args:
+            projects (list of str): row order
+            ids (list of tuple): twitter_id, discord_id of each project
+            end (str): last day, YYYY-MM-DD, or None
+
+        Returns:
+            str: names the cache for this input and the current data versions
+        """
+        key = json.dumps([projects, ids, end, self.windows, LIFE_SCORE_WINDOW,
+            self.store.version('twitter_scraped_data'), self.store.version('discord_scraped_data')])
+        return hashlib.sha256(key.encode()).hexdigest()[:16]
+
+    def load(self, key):
+        """
+        Args:
+            key (str): from cache_key()
+
+        Returns:
+            Features: the cached features, memory-mapped; None if not cached
+        """
+        folder = os.path.join(self.features_dir, key)
+        if not os.path.isdir(folder):
+            return None
+        with open(os.path.join(folder, 'meta.json')) as f:
+            meta = json.load(f)
+        values = np.load(os.path.join(folder, 'values.npy'), mmap_mode='r' if meta['size'] else None)
+        return Features(meta['projects'], np.array(meta['days'], dtype='datetime64[D]'), meta['names'], values)
+
+    def save(self, key, features):
+        """
+        Writes a feature set to its cache folder and drops the oldest caches past MAX_CACHED
+
+        Args:
+            key (str): from cache_key()
+            features (Features): computed features
+        """
+        folder = os.path.join(self.features_dir, key)
+        tmp = folder + '.tmp'
+        shutil.rmtree(tmp, ignore_errors=True)
+        os.makedirs(tmp)
+        np.save(os.path.join(tmp, 'values.npy'), features.values)
+        with open(os.path.join(tmp, 'meta.json'), 'w') as f:
+            json.dump({'projects': features.projects, 'days': [str(d) for d in features.days],
+                'names': features.names, 'size': int(features.values.size)}, f)
+        try:
+            os.rename(tmp, folder)
+        except OSError:
+            # Another process cached the same key first
+            shutil.rmtree(tmp, ignore_errors=True)
+
+        cached = [os.path.join(self.features_dir, f) for f in os.listdir(self.features_dir) if not f.endswith('.tmp')]
+        for old in sorted(cached, key=os.path.getmtime, reverse=True)[MAX_CACHED:]:
+            shutil.rmtree(old, ignore_errors=True)
+
+    def compute(self, dm, projects, end=None):
+        """
+        Features for every project and day, from the cache if the data has not changed
+
+        Args:
+            dm (DatabaseManager object): db handle, used to look up ids and refresh the column store
+            projects (list of str): project names, the row order of the result
+            end (str): last day, YYYY-MM-DD; defaults to the last day scraped
+
+        Returns:
+            Features: values[feature, project, day]
+        """
+        metadata = dm.get_project_metadata(projects)
+        ids = [(metadata.get(p, {}).get('twitter_id') or '', metadata.get(p, {}).get('discord_id') or '')
+            for p in projects]
+        self.store.refresh(dm, 'twitter_scraped_data')
+        self.store.refresh(dm, 'discord_scraped_data')
+        key = self.cache_key(projects, ids, end)
+        features = self.load(key)
+        if features is not None:
+            return features
+
+        # Both tables over the same days, so every feature lines up
+        days = [self.store.load(table)['day'] for table in ['twitter_scraped_data', 'discord_scraped_data']]
+        days = [d for d in days if len(d)]
+        start = to_dates([min(d[0] for d in days)])[0] if days else None
+        end = end or (to_dates([max(d[-1] for d in days)])[0] if days else None)
+        twitter = self.store.matrix('twitter_scraped_data', ['followers'], [i[0] for i in ids], start, end, FILL_FORWARD)
+        discord = self.store.matrix('discord_scraped_data', ['online', 'members'], [i[1] for i in ids], start, end, FILL_FORWARD)
+
+        values = compute_features(twitter.values['followers'], discord.values['online'],
+            discord.values['members'], self.windows)
+        self.save(key, Features(list(projects), twitter.days, self.names, values))
+        return self.load(key)
+
+    def matrix(self, features, names=None, day=-1):
+        """
+        Args:
+            features (Features): from compute()
+            names (list of str): features wanted, defaults to all
+            day (int): index into features.days, defaults to the last day
+
+        Returns:
+            np.ndarray: one row per project, one column per feature
+        """
+        rows = [features.names.index(n) for n in names] if names else slice(None)
+        return np.asarray(features.values[rows, :, day]).T
+
+if __name__ == '__main__':
+    # python FeatureEngine.py : features for every project, timing a run and a cached rerun
+    from DatabaseManager import DatabaseManager
+    dm = DatabaseManager(readonly=True)
+    engine = FeatureEngine()
+    projects = sorted(dm.get_project_metadata())
+    for run in ['First run', 'Rerun']:
+        start = time.time()
+        features = engine.compute(dm, projects)
+        print('{}: {} features for {} projects over {} days in {:.3f}s'.format(run, len(features.names),
+            len(projects), len(features.days), time.time() - start))
+    dm.close()
@@ -0,0 +1,150 @@
+import sys
+import time
+import threading
+
+from bs4 import BeautifulSoup, SoupStrainer
+from bs4.element import Tag
+
+LOGGING = False
+COMPARE = False     # also time a full html.parser parse of every page, for comparison
+
+# Fastest tree builder available; lxml is optional
+try:
+    import lxml
+    BACKEND = 'lxml'
+except ImportError:
+    BACKEND = 'html.parser'
+BASELINE = 'html.parser'
+
+class ParseTimes:
+    """
+    Running totals of time spent parsing pages, per scraper
+    """
+    def __init__(self):
+        self.totals = {}
+        self.lock = threading.Lock()
+
+    def record(self, source, seconds, baseline=None):
+        """
+        Args:
+            source (str): which scraper parsed the page
+            seconds (float): time taken by the backend
+            baseline (float): time a full html.parser parse took, if measured
+        """
+        with self.lock:
+            t = self.totals.setdefault(source, {'pages': 0, 'seconds': 0.0, 'baseline_pages': 0, 'baseline_seconds': 0.0})
+            t['pages'] += 1
+            t['seconds'] += seconds
+            if baseline is not None:
+                t['baseline_pages'] += 1
+                t['baseline_seconds'] += baseline
+        if LOGGING:
+            if baseline is not None:
+                print('\n{}: parsed in {:.1f}ms ({:.1f}ms with full {})'.format(source, seconds*1000, baseline*1000, BASELINE))
+            else:
+                print('\n{}: parsed in {:.1f}ms'.format(source, seconds*1000))
+
+    def report(self):
+        """
+        Prints the average parse time per page for each scraper
+        """
+        print('\n====== Parse times ({}) ======'.format(BACKEND))
+        for source, t in self.totals.items():
+            line = '{}: {} pages, {:.1f}ms/page'.format(source, t['pages'], t['seconds'] / t['pages'] * 1000)
+            if t['baseline_pages']:
+                baseline = t['baseline_seconds'] / t['baseline_pages']
+                line += ' vs {:.1f}ms/page with full {}'.format(baseline * 1000, BASELINE)
+            print(line)
+
+PARSE_TIMES = ParseTimes()
+
+def only(tag, class_=None, id=None):
+    """
+    Builds a strainer that keeps only the matching elements and their children
+
+    Args:
+        tag (str): html tag name, e.g. 'div'
+        class_ (str): css class the element must have, optional
+        id (str): id the element must have, optional
+
+    Returns:
+        SoupStrainer: pass to parse() as the strainer
+    """
+    attrs = {}
+    if class_:
+        # While parsing, class is still the raw attribute string, e.g. "text-left text-gray-800"
+        attrs['class'] = lambda value: value is not None and class_ in (value.split() if isinstance(value, str) else value)
+    if id:
+        attrs['id'] = id
+    return SoupStrainer(tag, attrs)
+
+def parse(html, strainer=None, source='page'):
+    """
+    Parses html with the fastest backend, optionally keeping only the elements we read
+
+    Args:
+        html (str): page source
+        strainer (SoupStrainer): from only(), or None to parse the whole page
+        source (str): name used when reporting parse times
+
+    Returns:
+        BeautifulSoup: the parsed page; empty if nothing matched the strainer
+    """
+    start = time.perf_counter()
+    soup = BeautifulSoup(html, BACKEND, parse_only=strainer)
+    seconds = time.perf_counter() - start
+
+    baseline = None
+    if COMPARE:
+        start = time.perf_counter()
+        BeautifulSoup(html, BASELINE)
+        baseline = time.perf_counter() - start
+    PARSE_TIMES.record(source, seconds, baseline)
+    return soup
+
+def child_tags(node):
+    """
+    Args:
+        node (bs4.element.Tag): any parsed element
+
+    Returns:
+        list (bs4.element.Tag): direct children that are elements, skipping text
+    """
+    return [x for x in node.contents if isinstance(x, Tag)]
+
+def compare(html, strainer=None, repeat=5):
+    """
+    Times the old full html.parser parse against the backend with and without the strainer
+
+    Args:
+        html (str): page source
+        strainer (SoupStrainer): from only(), optional
+        repeat (int): parses per measurement; the fastest is kept
+
+    Returns:
+        dict: label -> seconds per parse
+    """
+    runs = [('full ' + BASELINE, BASELINE, None), ('full ' + BACKEND, BACKEND, None)]
+    if strainer is not None:
+        runs.append(('targeted ' + BACKEND, BACKEND, strainer))
+
+    results = {}
+    for label, backend, only_these in runs:
+        best = None
+        for i in range(repeat):
+            start = time.perf_counter()
+            BeautifulSoup(html, backend, parse_only=only_these)
+            elapsed = time.perf_counter() - start
+            best = elapsed if best is None else min(best, elapsed)
+        results[label] = best
+    return results
+
+if __name__ == '__main__':
+    # python HtmlParser.py page.html [tag] [class]
+    with open(sys.argv[1], encoding='utf-8') as f:
+        page = f.read()
+    strainer = only(sys.argv[2], sys.argv[3] if len(sys.argv) > 3 else None) if len(sys.argv) > 2 else None
+    results = compare(page, strainer)
+    slowest = max(results.values())
+    for label, seconds in results.items():
+        print('{:>28}: {:8.2f}ms  ({:.1f}x)'.format(label, seconds * 1000, slowest / seconds))
@@ -0,0 +1,171 @@
+"""
+The cherry database schema, as an ordered list of migrations
+
+Each database records the last migration applied in PRAGMA user_version.
+migrate() applies the rest in order, one transaction each, so a database
+at any version is brought up to date on connection.
+Never edit a migration that has shipped; append a new one instead.
+
+_scraped_data tables hold daily snapshots keyed by (id, date), so per-id
+history is a primary key lookup; the (date) indexes serve whole-day scans.
+"""
+
+import sys
+
+from ConnectionPool import connect
+
+# (version, description, statements)
+MIGRATIONS = [
+    (1, 'original tables', [
+        """CREATE TABLE IF NOT EXISTS master_project_list(
+        name TEXT NOT NULL PRIMARY KEY,
+        release_date TEXT DEFAULT '',
+        twitter_id TEXT DEFAULT '',
+        discord_id TEXT DEFAULT '',
+        status TEXT,
+        rank INTEGER,
+        quantity INTEGER
+        );""",
+        """CREATE TABLE IF NOT EXISTS rarity_scraped_data(
+        name TEXT NOT NULL,
+        date TEXT NOT NULL,
+        release_date TEXT,
+        release_price REAL,
+        presale_date TEXT,
+        presale_price REAL,
+        quantity INTEGER,
+        currency TEXT,
+        twitter_id TEXT,
+        discord_id TEXT,
+        website TEXT,
+        PRIMARY KEY(name, date)
+        );""",
+        """CREATE TABLE IF NOT EXISTS twitter_scraped_data(
+        twitter_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        followers INTEGER,
+        following INTEGER,
+        activity INTEGER,
+        PRIMARY KEY(twitter_id, date)
+        );""",
+        """CREATE TABLE IF NOT EXISTS discord_scraped_data(
+        discord_id TEXT NOT NULL,
+        date TEXT NOT NULL,
+        online INTEGER,
+        members INTEGER,
+        activity INTEGER,
+        PRIMARY KEY(discord_id, date)
+        );""",
+        """CREATE TABLE IF NOT EXISTS default_tests(
+        name TEXT NOT NULL PRIMARY KEY,
+        twitter_id TEXT
+        );""",
+    ]),
+    (2, 'opensea prices, opensea slugs and rarity fingerprints', [
+        """CREATE TABLE IF NOT EXISTS opensea_scraped_data(
+        name TEXT NOT NULL,
+        date TEXT NOT NULL,
+        price REAL NOT NULL,
+        highest_last_sale REAL,
+        lowest_price REAL,
+        PRIMARY KEY(name, date)
+        );""",
+        """CREATE TABLE IF NOT EXISTS master_opensea_slugs(
+        name TEXT NOT NULL PRIMARY KEY,
+        slug TEXT NOT NULL,
+        confidence REAL,
+        last_verified TEXT
+        );""",
+        """CREATE TABLE IF NOT EXISTS master_rarity_fingerprints(
+        name TEXT NOT NULL PRIMARY KEY,
+        fingerprint TEXT NOT NULL,
+        cells TEXT,
+        last_changed TEXT
+        );""",
+    ]),
+    (3, 'daily run checkpoints', [
+        """CREATE TABLE IF NOT EXISTS job_progress(
+        run_date TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        id TEXT NOT NULL,
+        PRIMARY KEY(run_date, stage, id)
+        );""",
+        """CREATE TABLE IF NOT EXISTS job_stages(
+        run_date TEXT NOT NULL,
+        stage TEXT NOT NULL,
+        finished TEXT,
+        PRIMARY KEY(run_date, stage)
+        );""",
+    ]),
+    (4, 'indexes for release date filters, id removal and whole-day scans', [
+        'CREATE INDEX IF NOT EXISTS master_project_list_release_date ON master_project_list(release_date);',
+        'CREATE INDEX IF NOT EXISTS master_project_list_twitter_id ON master_project_list(twitter_id);',
+        'CREATE INDEX IF NOT EXISTS master_project_list_discord_id ON master_project_list(discord_id);',
+        'CREATE INDEX IF NOT EXISTS rarity_scraped_data_date ON rarity_scraped_data(date);',
+        'CREATE INDEX IF NOT EXISTS twitter_scraped_data_date ON twitter_scraped_data(date);',
+        'CREATE INDEX IF NOT EXISTS discord_scraped_data_date ON discord_scraped_data(date);',
+        'CREATE INDEX IF NOT EXISTS opensea_scraped_data_date ON opensea_scraped_data(date);',
+    ]),
+    (5, 'prediction algorithm accuracy', [
+        """CREATE TABLE IF NOT EXISTS master_prediction_algorithms(
+        name TEXT NOT NULL PRIMARY KEY,
+        status TEXT NOT NULL DEFAULT 'active',
+        accuracy REAL,
+        projects INTEGER,
+        last_trained TEXT
+        );""",
+    ]),
+]
+
+LATEST_VERSION = MIGRATIONS[-1][0]
+
+def current_version(connection):
+    """
+    Args:
+        connection (sqlite3.Connection): open database
+
+    Returns:
+        int: the last migration applied, 0 for a new or unversioned database
+    """
+    return connection.execute('PRAGMA user_version;').fetchone()[0]
+
+def migrate(connection, verbose=False):
+    """
+    Applies every migration newer than the database's user_version, in order
+    Each runs in its own write transaction, and the version is re-read under the
+    write lock, so two connections migrating at once apply each migration only once
+
+    Args:
+        connection (sqlite3.Connection): open, writable database, not in a transaction
+        verbose (bool): print each migration as it is applied
+
+    Returns:
+        int: the database's version afterwards
+    """
+    if current_version(connection) >= LATEST_VERSION:
+        return LATEST_VERSION
+    for version, description, statements in MIGRATIONS:
+        connection.execute('BEGIN IMMEDIATE;')
+        try:
+            if current_version(connection) >= version:
+                connection.execute('COMMIT;')
+                continue
+            for sql in statements:
+                connection.execute(sql)
+            connection.execute('PRAGMA user_version = {};'.format(version))
+            connection.execute('COMMIT;')
+        except Exception:
+            connection.execute('ROLLBACK;')
+            raise
+        if verbose:
+            print('Migrated to version {}: {}'.format(version, description))
+    return LATEST_VERSION
+
+if __name__ == '__main__':
+    # python Migrations.py [db_file]
+    from DatabaseManager import DB_FILE
+    db_file = sys.argv[1] if len(sys.argv) > 1 else DB_FILE
+    conn = connect(db_file)
+    print('{} is at version {}'.format(db_file, current_version(conn)))
+    migrate(conn, verbose=True)
+    conn.close()
@@ -1,39 +1,67 @@
 import sys
-import time
+from datetime import date, datetime, timedelta
 
-from bs4 import BeautifulSoup
-from bs4.element import Tag
-
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support import expected_conditions as EC
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
-from selenium.common.exceptions import TimeoutException, WebDriverException
 
+from BrowserSession import new_driver
+from HtmlParser import parse, only, child_tags
 from DatabaseManager import DatabaseManager
+from PageReadiness import READINESS
 
 SEARCHBAR_DIV_CLASS = 'sc-3dr67n-0'
 PREVIEW_RESULTS_ID = "NavSearch--results"
+COLLECTION_URL = "https://opensea.io/collection/{}"
 LOGGING = True
 WAIT_TIME = 5
+SOUP_STRAINER = only("ul", id=PREVIEW_RESULTS_ID)
+SLUG_STALE_DAYS = 30        # re-run the search for slugs not verified in this long
+MIN_SLUG_CONFIDENCE = 0.5   # slugs below this are not trusted for direct navigation
 
 class OpenseaScraper:
     """
     An object to collect data from opensea marketplace
     """
-    def __init__(self, projects):
+    def __init__(self, projects, session=None, metadata=None, slugs=None, archive=None, sink=None):
+        """
+        Args:
+            projects (list of str): project names to scrape
+            session (BrowserSession): shared browsers, optional
+            metadata (dict): project name -> master_project_list fields, from
+                DatabaseManager.get_project_metadata(); looked up once if not given
+            slugs (dict): project name -> collection slug data, from
+                DatabaseManager.get_opensea_slugs(); looked up once if not given
+            archive (PageArchive): where to keep fetched pages, optional
+            sink (DatabaseWriter): where to send records as they are scraped, optional
+        """
         self.projects = projects
+        self.session = session
+        self.metadata = metadata
+        self.slugs = slugs
+        self.archive = archive
+        self.date = date.today().strftime('%Y-%m-%d')
+        self.updated_slugs = {}
         self.current_project = None
         self.soup = None
-        self.data = []
+        self.data = [] if sink is None else sink
 
     def open_chrome(self):
         """
         Open up a virtual Chrome browser
+        Borrows a warm browser from the session if one was given
+        """
+        if self.session:
+            self.driver = self.session.acquire()
+        else:
+            self.driver = new_driver()
+
+    def close_chrome(self):
+        """
+        Close the virtual Chrome browser, or hand it back to the session
         """
-        self.driver = webdriver.Chrome(ChromeDriverManager().install())
-        print('====== CherryJam driving ======')
+        if self.session:
+            self.session.release(self.driver)
+        else:
+            self.driver.quit()
 
     def retrieve_opensea_url(self):
         """
@@ -51,64 +79,58 @@ class OpenseaScraper:
         """
         Wait for the page to load
         """
-        try:
-            WebDriverWait(self.driver, WAIT_TIME).until(
-                EC.presence_of_element_located((By.CLASS_NAME, SEARCHBAR_DIV_CLASS))
-            )
-        except TimeoutException:
+        ready = READINESS.wait_for(self.driver, 'opensea', (By.CLASS_NAME, SEARCHBAR_DIV_CLASS), WAIT_TIME)
+        if not ready:
             error = '\nError: Homepage timed out'
             if LOGGING:
                 print(error)
 
+    def load_wait_collection(self):
+        """
+        Wait for a collection page to load
+
+        Returns:
+            bool: True if the page loaded in time
+        """
+        ready = READINESS.wait_for(self.driver, 'opensea_collection', (By.TAG_NAME, 'h1'), WAIT_TIME)
+        if not ready:
+            error = '\n{}\nError: Collection page timed out'.format(self.current_project)
+            if LOGGING:
+                print(error)
+        return ready
+
     def load_wait_results(self):
         """
         Wait for the search results to load
         In the results preview (after typing but not pressing enter)
+        Returns as soon as the results list appears and stops changing
         """
-        #TODO check whether this is actually working
-        time.sleep(WAIT_TIME)
-        # try:
-        #     WebDriverWait(self.driver, WAIT_TIME).until(
-        #         EC.presence_of_element_located((By.ID, "PREVIEW_RESULTS_ID"))
-        #     )
-        # except TimeoutException:
-        #     error = '\n{}\nError: Preview results timed out'.format(self.current_project)
-        #     if LOGGING:
-        #         print(error)
-        # except WebDriverException:
-        #     error = '\n{}\nError: Selenium cannot determine loading status. Manually waiting.'.format(self.current_project)       
-        #     if LOGGING:
-        #         print(error)
-        #     time.sleep(WAIT_TIME)
-
-    # def load_wait_projectpage(self):
-    #     """
-    #     Wait for the page to load
-    #     """
-    #     try:
-    #         WebDriverWait(self.driver, WAIT_TIME).until(
-    #             EC.presence_of_element_located((By.CLASS_NAME, SEARCHBAR_DIV_CLASS))
-    #         )
-    #     except TimeoutException:
-    #         error = '\n{}\nError: Project page timed out'.format(self.current_project)
-    #         if LOGGING:
-    #             print(error)
-    #     except WebDriverException:
-    #         error = '\n{}\nError: Selenium cannot determine loading status. Manually waiting.'.format(self.current_project)       
-    #         if LOGGING:
-    #             print(error)
-    #         time.sleep(WAIT_TIME)
+        ready = READINESS.wait_for(self.driver, 'opensea_search', (By.ID, PREVIEW_RESULTS_ID), WAIT_TIME, settle=True)
+        if not ready:
+            error = '\n{}\nError: Preview results timed out'.format(self.current_project)
+            if LOGGING:
+                print(error)
 
     def make_soup(self):
         """
-        Get the current html                        
+        Get the current html, archiving it if an archive was given
+        Only the elements we read are parsed; the soup is empty if they are missing
         """
         html = self.driver.page_source
-        soup = BeautifulSoup(html, "html.parser")
-        if soup:
-            self.soup = soup
-        else:
-            error = '\n{}\nError: Could not get current html'.format(self.current_user)
+        if self.archive:
+            self.archive.store('opensea', self.current_project, self.date, html)
+        self.read_html(html)
+
+    def read_html(self, html):
+        """
+        Parse page html, from the live browser or from the page archive
+
+        Args:
+            html (str): page source
+        """
+        self.soup = parse(html, SOUP_STRAINER, 'opensea')
+        if not self.soup:
+            error = '\n{}\nError: Could not find search results in the current html'.format(self.current_project)
             if LOGGING:
                 print(error)
 
@@ -127,8 +149,11 @@ class OpenseaScraper:
         self.load_wait_results()
         self.make_soup()
         ul = self.soup.find("ul", id=PREVIEW_RESULTS_ID)
-        #ul = soup.find("ul", id="NavSearch--results")
-        lis = [x for x in ul if isinstance(x, Tag)]
+        if ul is None:
+            if LOGGING:
+                print("No preview search results for {}\n".format(project))
+            return None
+        lis = child_tags(ul)
 
         for li in lis:
             text = li.getText()
@@ -145,7 +170,7 @@ class OpenseaScraper:
                 found_items = int(items_text.split(' item')[0].replace(",",""))
                 print('- {}, {}'.format(found_name, found_items))
 
-                if (found_name == project) and (found_items == quantity):
+                if (found_name == project.lower()) and (found_items == quantity):
                     print('Found a match!')
                     link = li.find('a')
                     return link
@@ -156,6 +181,119 @@ class OpenseaScraper:
             print(msg)
         return None
 
+    def slug_from_link(self, link):
+        """
+        Reads the collection slug out of a search result link
+
+        Args:
+            link (bs4.Element.Tag): <a> element pointing at /collection/<slug>
+
+        Returns:
+            str: collection slug, or None if the link is not a collection
+        """
+        href = link.get('href') or ''
+        parts = href.split('/collection/')
+        if len(parts) != 2:
+            return None
+        return parts[1].split('/')[0].split('?')[0] or None
+
+    def cached_slug(self, project):
+        """
+        Finds a trusted, recently verified slug for the project
+
+        Args:
+            project (str): project name
+
+        Returns:
+            str: collection slug, or None on a cache miss or stale entry
+        """
+        entry = self.slugs.get(project)
+        if not entry or (entry['confidence'] or 0) < MIN_SLUG_CONFIDENCE:
+            return None
+        # Never verified counts as stale
+        if not entry['last_verified']:
+            return None
+        last_verified = datetime.strptime(entry['last_verified'], '%Y-%m-%d').date()
+        if date.today() - last_verified > timedelta(days=SLUG_STALE_DAYS):
+            return None
+        return entry['slug']
+
+    def record_slug(self, project, slug, confidence):
+        """
+        Remembers a verified slug so it can be written back to the database
+
+        Args:
+            project (str): project name
+            slug (str): collection slug
+            confidence (float): how sure we are that the slug is this project, 0-1
+        """
+        entry = {'name': project, 'slug': slug, 'confidence': confidence,
+            'last_verified': date.today().strftime('%Y-%m-%d')}
+        self.slugs[project] = entry
+        self.updated_slugs[project] = entry
+
+    def open_collection(self, project, slug):
+        """
+        Goes straight to a collection page and checks it belongs to the project
+
+        Args:
+            project (str): project name
+            slug (str): collection slug
+
+        Returns:
+            bool: True if the collection page loaded and matches the project
+        """
+        url = COLLECTION_URL.format(slug)
+        try:
+            self.driver.get(url)
+        except:
+            error = '\nError: Could not retrieve the url: {}'.format(url)
+            if LOGGING:
+                print(error)
+            return False
+        if not self.load_wait_collection():
+            return False
+
+        title = self.driver.find_element(By.TAG_NAME, 'h1').text.strip().lower()
+        if title != project.lower():
+            if LOGGING:
+                print('\n{}\nError: Collection {} is titled {}'.format(project, slug, title))
+            return False
+
+        confidence = self.slugs.get(project, {}).get('confidence') or 1.0
+        self.record_slug(project, slug, confidence)
+        return True
+
+    def search_collection(self, project):
+        """
+        Finds a project's collection slug through the opensea search bar
+
+        Args:
+            project (str): project name
+
+        Returns:
+            str: collection slug, or None if no matching collection was found
+        """
+        #TODO clear search bar instead of refreshing
+        self.retrieve_opensea_url()
+        self.load_wait_homepage()
+
+        # Type name into search bar
+        input = self.driver.find_element(By.XPATH, "//input")
+        input.send_keys(project)
+
+        # Lookup quantity from the preloaded project data
+        quantity = self.metadata.get(project, {}).get('quantity')
+        match = self.search_find_match(project, quantity)
+        if not match:
+            return None
+
+        slug = self.slug_from_link(match)
+        if slug:
+            # search_find_match only accepts an exact name and quantity match
+            self.record_slug(project, slug, 1.0)
+        return slug
+
     def batch_scrape(self):
         """
         Runs a new batch of data collection
@@ -163,6 +301,13 @@ class OpenseaScraper:
         Returns:
             list (str): projects that were not found
         """
+        if self.metadata is None or self.slugs is None:
+            dm = DatabaseManager()
+            if self.metadata is None:
+                self.metadata = dm.get_project_metadata(self.projects)
+            if self.slugs is None:
+                self.slugs = dm.get_opensea_slugs()
+
         self.open_chrome()
         failures = []
 
@@ -174,24 +319,15 @@ class OpenseaScraper:
             ### need a better way of tracking down price data
             ### maybe check the item list for name #1234, then go to collection from there
             ### LOOK INTO OPENSEA API
-            #TODO clear search bar instead of refreshing
-            self.retrieve_opensea_url()
-            self.load_wait_homepage()
 
-            # Type name into search bar
-            input = self.driver.find_element(By.XPATH, "//input")
-            input.send_keys(project)
-            self.load_wait_results()
-            self.make_soup()
-
-            # Lookup quantity from db
-            dm = DatabaseManager()
-            quantity = dm.lookup_quantity(project)
-            match = self.search_find_match(project, quantity)
+            # Go straight to the collection if its slug is known, search only on a miss
+            slug = self.cached_slug(project)
+            if not (slug and self.open_collection(project, slug)):
+                slug = self.search_collection(project)
+                if slug and not self.open_collection(project, slug):
+                    slug = None
 
-            # if match:
-            #     self.click_result(match)
-            #     # self.load_wait_projectpage()
+            # if slug:
             #     self.make_soup()
             #     name = self.soup.find('h1').getText()
             #     print(name)
@@ -201,8 +337,7 @@ class OpenseaScraper:
                 # if price:
                 #     hls = self.get_highest_last_price()
                 #     lp = self.get_lowest_price()
-                #     project_data = {'name': project, 'price': price, 'highest_last_sale': hls, 'lowest_price': lp}
-                #     self.data.append(project)
+                #     self.data.append(OpenseaRecord(project, self.date, price, hls, lp))
                 # else:
                 #     failures.append(project)
                 
@@ -212,13 +347,20 @@ class OpenseaScraper:
             sys.stdout.write('\r[{}/{}]'.format(i, len(self.projects)))
             sys.stdout.flush()
 
-        self.driver.quit()
+        self.close_chrome()
         return failures
 
+    def dump_slugs(self):
+        """
+        Returns:
+            list of dicts: collection slugs found or re-verified during this batch
+        """
+        return list(self.updated_slugs.values())
+
     def dump_data(self):
         """
         Returns:
-            list of dicts: all scraped data
+            list of records: all scraped data, or the sink they were sent to
 
         """
         return self.data
\ No newline at end of file
@@ -0,0 +1,133 @@
+import hashlib
+import os
+import sqlite3
+import threading
+
+# zstandard is optional; pages fall back to zlib if it is missing
+try:
+    import zstandard
+except ImportError:
+    zstandard = None
+import zlib
+
+ARCHIVE_DIR = './archive'
+ZSTD_LEVEL = 10
+ZLIB_LEVEL = 6
+
+class PageArchive:
+    """
+    A content-addressed store of every page the scrapers fetch
+    Pages are compressed and saved once per unique content, under archive/objects/,
+    and an index maps (source, id, date) to the content hash so any day can be re-parsed
+    """
+    def __init__(self, archive_dir=ARCHIVE_DIR):
+        """
+        Args:
+            archive_dir (str): folder holding the index and page objects
+        """
+        self.archive_dir = archive_dir
+        self.objects_dir = os.path.join(archive_dir, 'objects')
+        os.makedirs(self.objects_dir, exist_ok=True)
+
+        self.lock = threading.Lock()
+        self.connection = sqlite3.connect(os.path.join(archive_dir, 'index.db'), check_same_thread=False)
+        self.connection.execute("""CREATE TABLE IF NOT EXISTS pages(
+                source TEXT NOT NULL,
+                id TEXT NOT NULL,
+                date TEXT NOT NULL,
+                hash TEXT NOT NULL,
+                PRIMARY KEY(source, id, date)
+                );""")
+        self.connection.commit()
+
+    def object_path(self, digest, extension):
+        """
+        Args:
+            digest (str): sha256 of the page
+            extension (str): '.zst' or '.zz'
+
+        Returns:
+            str: where the compressed page lives
+        """
+        return os.path.join(self.objects_dir, digest[:2], digest + extension)
+
+    def store(self, source, id, date, html):
+        """
+        Saves a fetched page; identical pages are only written once
+
+        Args:
+            source (str): which scraper fetched it, e.g. 'twitter'
+            id (str): twitter_id, discord_id, project name or page name
+            date (str): scrape date as YYYY-MM-DD
+            html (str): page source
+
+        Returns:
+            str: the page's content hash
+        """
+        data = html.encode('utf-8')
+        digest = hashlib.sha256(data).hexdigest()
+
+        if zstandard is not None:
+            path = self.object_path(digest, '.zst')
+        else:
+            path = self.object_path(digest, '.zz')
+        if not os.path.isfile(path):
+            if zstandard is not None:
+                compressed = zstandard.ZstdCompressor(level=ZSTD_LEVEL).compress(data)
+            else:
+                compressed = zlib.compress(data, ZLIB_LEVEL)
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+            # Write then rename so a crash never leaves a half-written object
+            tmp = path + '.tmp{}'.format(threading.get_ident())
+            with open(tmp, 'wb') as f:
+                f.write(compressed)
+            os.replace(tmp, path)
+
+        with self.lock:
+            self.connection.execute('REPLACE INTO pages (source, id, date, hash) VALUES (?, ?, ?, ?);',
+                (source, id, date, digest))
+            self.connection.commit()
+        return digest
+
+    def find(self, source, start_date, end_date):
+        """
+        Lists archived pages for a source between two dates, inclusive
+
+        Args:
+            source (str): which scraper fetched them
+            start_date (str): YYYY-MM-DD
+            end_date (str): YYYY-MM-DD
+
+        Returns:
+            list of tuples (str): id, date, hash
+        """
+        with self.lock:
+            cursor = self.connection.execute("""SELECT id, date, hash FROM pages
+                    WHERE source = ? AND date >= ? AND date <= ?
+                    ORDER BY date, id;""", (source, start_date, end_date))
+            return cursor.fetchall()
+
+    def close(self):
+        self.connection.close()
+
+def load_page(digest, archive_dir=ARCHIVE_DIR):
+    """
+    Reads an archived page back; safe to call from worker processes
+
+    Args:
+        digest (str): the page's content hash
+        archive_dir (str): folder holding the page objects
+
+    Returns:
+        str: page source
+    """
+    base = os.path.join(archive_dir, 'objects', digest[:2], digest)
+    if os.path.isfile(base + '.zst'):
+        if zstandard is None:
+            raise RuntimeError('zstandard is required to read {}.zst'.format(base))
+        with open(base + '.zst', 'rb') as f:
+            data = zstandard.ZstdDecompressor().decompress(f.read())
+    else:
+        with open(base + '.zz', 'rb') as f:
+            data = zlib.decompress(f.read())
+    return data.decode('utf-8')
@@ -0,0 +1,181 @@
+import threading
+import time
+from collections import deque
+
+from selenium.webdriver.support import expected_conditions as EC
+from selenium.webdriver.common.by import By
+from selenium.webdriver.support.wait import WebDriverWait
+from selenium.common.exceptions import TimeoutException, WebDriverException
+
+POLL_FREQUENCY = 0.1    # seconds between DOM checks
+HISTORY = 20            # recent load times remembered per site
+MIN_SAMPLES = 5         # load times needed before the timeout adapts
+TIMEOUT_MARGIN = 2.0    # learned timeout = slow recent load * margin
+MIN_TIMEOUT = 3.0       # fast sites still get a few seconds before a load counts as failed
+MAX_TIMEOUT = 20.0
+QUIET_MS = 300          # DOM is considered settled after this long without mutations
+SETTLE_TIMEOUT = 4 * QUIET_MS / 1000    # longest wait for the DOM to settle; tickers and lazy images never do
+SCRIPT_TIMEOUT = 30     # WebDriver's default script timeout, restored when it cannot be read back
+
+# With a selector: resolves true as soon as it matches
+# Without one: resolves once the DOM has stopped changing for quietMs
+WATCH_DOM_JS = """
+var quietMs = arguments[0];
+var selector = arguments[1];
+var done = arguments[arguments.length - 1];
+var finished = false;
+var timer = null;
+var observer = null;
+function finish(result) {
+    if (finished) { return; }
+    finished = true;
+    if (observer) { observer.disconnect(); }
+    clearTimeout(timer);
+    done(result);
+}
+function restart() {
+    clearTimeout(timer);
+    timer = setTimeout(function() { finish(false); }, quietMs);
+}
+if (selector && document.querySelector(selector)) { finish(true); return; }
+observer = new MutationObserver(function() {
+    if (!selector) { restart(); }
+    else if (document.querySelector(selector)) { finish(true); }
+});
+observer.observe(document, {childList: true, subtree: true, attributes: true, characterData: true});
+if (!selector) { restart(); }
+"""
+
+def css_selector(locator):
+    """
+    Converts a selenium locator into a CSS selector where possible
+
+    Args:
+        locator (tuple): selenium locator, e.g. (By.CLASS_NAME, 'dataTable')
+
+    Returns:
+        str: CSS selector, or None if the locator type has no CSS equivalent
+    """
+    by, value = locator
+    if by == By.CLASS_NAME:
+        return '.' + value
+    if by == By.ID:
+        return '#' + value
+    if by in (By.CSS_SELECTOR, By.TAG_NAME):
+        return value
+    return None
+
+class PageReadiness:
+    """
+    Waits for pages to be ready by watching the DOM instead of sleeping
+    Remembers how long each site takes to load and uses that to pick a timeout,
+    so a fast site is not held to the worst-case wait time
+    """
+    def __init__(self):
+        self.load_times = {}
+        self.lock = threading.Lock()
+
+    def record(self, site, seconds):
+        """
+        Remembers how long a page took to become ready
+
+        Args:
+            site (str): name of the website, e.g. 'twitter'
+            seconds (float): time until the page was ready
+        """
+        with self.lock:
+            if site not in self.load_times:
+                self.load_times[site] = deque(maxlen=HISTORY)
+            self.load_times[site].append(seconds)
+
+    def timeout(self, site, default, floor=MIN_TIMEOUT):
+        """
+        Picks a timeout for the site from its recent load times
+
+        Args:
+            site (str): name of the website
+            default (float): timeout to use until enough loads have been seen
+            floor (float): shortest timeout to learn
+
+        Returns:
+            float: seconds to wait before giving up
+        """
+        with self.lock:
+            times = sorted(self.load_times.get(site, []))
+        if len(times) < MIN_SAMPLES:
+            return default
+        slow = times[int(len(times) * 0.9) - 1]
+        return min(MAX_TIMEOUT, max(floor, slow * TIMEOUT_MARGIN))
+
+    def watch_dom(self, driver, timeout, selector=None, quiet_ms=QUIET_MS):
+        """
+        Waits inside the browser on DOM mutations, for a selector or for the page to settle
+
+        Args:
+            driver (webdriver.Chrome): browser to wait on
+            timeout (float): seconds to wait before giving up
+            selector (str): CSS selector to wait for; if None, wait for the DOM to settle
+            quiet_ms (int): milliseconds without mutations that count as settled
+
+        Returns:
+            bool: True if the selector was found
+        """
+        # Browsers are shared between scrapers, so put their script timeout back afterwards
+        try:
+            previous = driver.timeouts.script
+        except (AttributeError, WebDriverException):
+            previous = SCRIPT_TIMEOUT
+        driver.set_script_timeout(timeout)
+        try:
+            return bool(driver.execute_async_script(WATCH_DOM_JS, quiet_ms, selector))
+        finally:
+            driver.set_script_timeout(previous)
+
+    def wait_for(self, driver, site, locator, default, settle=False, keep_default=False):
+        """
+        Waits until the element is on the page, polling quickly
+        A load that times out is remembered as taking the whole timeout, so a site
+        that slows down gets longer timeouts instead of failing every load
+
+        Args:
+            driver (webdriver.Chrome): browser to wait on
+            site (str): name of the website, used to learn its timeout
+            locator (tuple): selenium locator, e.g. (By.CLASS_NAME, 'dataTable')
+            default (float): timeout to use until the site's timeout is learned
+            settle (bool): after the element appears, also wait for the DOM to stop changing
+            keep_default (bool): never learn a timeout shorter than default; for sites
+                where a failed load has consequences, such as the id being removed
+
+        Returns:
+            bool: True if the element was found in time
+        """
+        timeout = self.timeout(site, default, default if keep_default else MIN_TIMEOUT)
+        start = time.time()
+        try:
+            WebDriverWait(driver, timeout, poll_frequency=POLL_FREQUENCY).until(
+                EC.presence_of_element_located(locator)
+            )
+        except TimeoutException:
+            self.record(site, timeout)
+            return False
+        except WebDriverException:
+            # Selenium cannot poll this page, fall back to watching DOM mutations
+            try:
+                found = self.watch_dom(driver, timeout, css_selector(locator))
+            except WebDriverException:
+                found = False
+            if not found:
+                self.record(site, timeout)
+                return False
+        # Learn from the load alone; settling can take as long as SETTLE_TIMEOUT on busy pages
+        self.record(site, time.time() - start)
+        if settle:
+            # The element is there; give its contents a moment to finish rendering
+            try:
+                self.watch_dom(driver, SETTLE_TIMEOUT)
+            except WebDriverException:
+                pass
+        return True
+
+# Shared by every scraper so all workers learn from the same load times
+READINESS = PageReadiness()
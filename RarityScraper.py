@@ -1,72 +1,345 @@
 import datetime
+import json
 import os
 import sys
 
-from bs4 import BeautifulSoup
-from selenium import webdriver
-from webdriver_manager.chrome import ChromeDriverManager
-from selenium.webdriver.support import expected_conditions as EC
+from selenium.common.exceptions import TimeoutException
 from selenium.webdriver.common.by import By
-from selenium.webdriver.support.wait import WebDriverWait
+from selenium.webdriver.support.ui import WebDriverWait
 
+from BrowserSession import new_driver
+from HtmlParser import parse, only
+from PageReadiness import READINESS
 from Rarity_PageElement import Rarity_PageElement
-from Rarity_NFTData import Rarity_NFTData
+from Rarity_NFTData import Rarity_NFTData, parse_batch, PARSER_VERSION
 
 RARITY_URL = "https://rarity.tools/upcoming"
+WAIT_TIME = 10
+PAGE_WAIT_TIME = 10     # seconds to wait for the next page or scroll to add rows
+MAX_PAGES = 200         # stop paging after this many, in case the table never ends
+BATCH_SIZE = 100        # listings parsed together by scrape_upcoming
+SOUP_STRAINER = only("tr", "text-left")
+
+# How listings are read off the page:
+#   'script' - one script in the browser returns every row as a compact array
+#   'soup'   - serialize the page and walk each <tr> with Rarity_PageElement
+EXTRACTION_MODE = 'script'
+
+DIFF_LOGGING = True
+# Release text relative to the scrape date parses differently every day, so it is never skipped
+RELATIVE_DATE_WORDS = ['today', 'tomorrow', 'yesterday']
+CELL_NAMES = ['name', 'discord', 'twitter', 'website', 'quantity', 'price', 'release']
+
+# Mirrors Rarity_PageElement.process_html: [title, [hrefs], price, total, release] per row
+# arguments[0] is the first row to read, so rows already read after a scroll are skipped
+EXTRACT_ROWS_JS = """
+var rows = document.querySelectorAll('tr.text-left');
+var out = [];
+for (var i = arguments[0] || 0; i < rows.length; i++) {
+    var tds = rows[i].children;
+    if (tds.length < 4 || !tds[0].children.length || tds[2].children.length < 2) { continue; }
+    var links = [];
+    for (var j = 0; j < tds[1].children.length; j++) {
+        links.push(tds[1].children[j].getAttribute('href'));
+    }
+    var release = '';
+    for (var j = 0; j < tds[3].children.length; j++) {
+        release += tds[3].children[j].textContent + '\\n';
+    }
+    out.push([tds[0].children[0].textContent, links,
+        tds[2].children[0].textContent, tds[2].children[1].textContent, release]);
+}
+return out;
+"""
+
+# Row count and first row text, to tell when the table has moved on
+TABLE_STATE_JS = """
+var rows = document.querySelectorAll('tr.text-left');
+return [rows.length, rows.length ? rows[0].textContent : ''];
+"""
+
+# outerHTML of the rows from arguments[0] on, for the soup mode and the page archive
+# Only the rows a step added are serialized, so a long infinite scroll is not copied again on every step
+ROWS_HTML_JS = """
+var rows = document.querySelectorAll('tr.text-left');
+var out = [];
+for (var i = arguments[0] || 0; i < rows.length; i++) {
+    out.push(rows[i].outerHTML);
+}
+return '<table>' + out.join('') + '</table>';
+"""
+
+# Clicks an enabled 'Next' button if the table is paginated, otherwise scrolls for more rows
+NEXT_PAGE_JS = """
+var buttons = document.querySelectorAll('button, a');
+for (var i = 0; i < buttons.length; i++) {
+    var b = buttons[i];
+    if (b.textContent.trim().toLowerCase() == 'next' && !b.disabled && b.getAttribute('aria-disabled') != 'true') {
+        b.click();
+        return 'next';
+    }
+}
+window.scrollTo(0, document.body.scrollHeight);
+return 'scroll';
+"""
 
 class RarityScraper:
     """
     An object to collect data from the website: rarity.tools
     """
-    def __init__(self):
+    def __init__(self, session=None, archive=None, fingerprints=None):
+        """
+        Args:
+            session (BrowserSession): shared browsers, optional
+            archive (PageArchive): where to keep fetched pages, optional
+            fingerprints (dict): project name -> stored fingerprint data, from
+                DatabaseManager.get_rarity_fingerprints(); unchanged listings are skipped
+        """
+        self.session = session
+        self.archive = archive
+        self.fingerprints = fingerprints or {}
+        self.date = datetime.date.today().strftime('%Y-%m-%d')
         self.soup = None
         self.NFTs = []
+        self.unchanged = []
+        self.new_fingerprints = {}
 
-    def make_soup(self):  
+    def open_page(self):
         """
-        Visit the webpage at self.rarity_tools_utl and gather all html
+        Visit the webpage at RARITY_URL and wait for the table to load
+
+        Returns:
+            webdriver.Chrome: browser showing the page, to be passed to close_page()
         """
-        driver = webdriver.Chrome(ChromeDriverManager().install())
+        if self.session:
+            driver = self.session.acquire()
+        else:
+            driver = new_driver()
         driver.get(RARITY_URL)
-        print('====== CherryJam driving ======')
 
         # Wait for page to load
-        WebDriverWait(driver, 10).until(
-            EC.presence_of_element_located((By.CLASS_NAME, "dataTable"))
-        )
+        if not READINESS.wait_for(driver, 'rarity', (By.CLASS_NAME, "dataTable"), WAIT_TIME, settle=True):
+            print('Error: Timed out waiting for the table on {}'.format(RARITY_URL))
+        return driver
+
+    def close_page(self, driver):
+        """
+        Close the browser, or hand it back to the session
+        """
+        if self.session:
+            self.session.release(driver)
+        else:
+            driver.quit()
+
+    def make_soup(self, html):
+        """
+        Parse the table rows out of the page html
+
+        Args:
+            html (str): page source, from the browser or the page archive
+        """
+        self.soup = parse(html, SOUP_STRAINER, 'rarity')
+        if not self.soup:
+            print('Error: Could not scrape the webpage {}'.format(RARITY_URL))
 
-        html = driver.page_source
-        driver.quit()
+    def listings_from_html(self, html):
+        """
+        Args:
+            html (str): page source, from the browser or the page archive
 
-        self.soup = BeautifulSoup(html, "html.parser")
+        Returns:
+            list (Rarity_PageElement): one listing per table row
+        """
+        self.make_soup(html)
         if not self.soup:
+            return []
+        content_trs = self.soup.find_all("tr", "text-left", "text-gray-800")
+        return [Rarity_PageElement(tr) for tr in content_trs]
+
+    def extract_rows(self, driver, start=0):
+        """
+        Read every listing's text in the browser, skipping html serialization and parsing
+
+        Args:
+            driver (webdriver.Chrome): browser from open_page()
+            start (int): index of the first table row to read
+
+        Returns:
+            list (Rarity_PageElement): one listing per table row
+        """
+        rows = driver.execute_script(EXTRACT_ROWS_JS, start) or []
+        if not rows and not start:
             print('Error: Could not scrape the webpage {}'.format(RARITY_URL))
+        return [Rarity_PageElement.from_row(row) for row in rows]
+
+    def next_page(self, driver):
+        """
+        Moves the table on to its next page, or scrolls to load more rows
+
+        Args:
+            driver (webdriver.Chrome): browser from open_page()
+
+        Returns:
+            str: 'next' or 'scroll' for how the table moved on, None if no new rows appeared
+        """
+        before = driver.execute_script(TABLE_STATE_JS)
+        how = driver.execute_script(NEXT_PAGE_JS)
+        try:
+            WebDriverWait(driver, PAGE_WAIT_TIME).until(lambda d: d.execute_script(TABLE_STATE_JS) != before)
+        except TimeoutException:
+            return None
+        return how
+
+    def read_listings(self):
+        """
+        Gather listings using EXTRACTION_MODE, following pagination and infinite scroll
+        Each page is yielded as soon as it has loaded, so nothing waits on the whole table
+
+        Yields:
+            list (Rarity_PageElement): the listings that page added
+        """
+        driver = self.open_page()
+        try:
+            start = 0
+            for page in range(1, MAX_PAGES + 1):
+                html = None
+                if self.archive or EXTRACTION_MODE != 'script':
+                    html = driver.execute_script(ROWS_HTML_JS, start)
+                if self.archive:
+                    page_id = 'upcoming' if page == 1 else 'upcoming-{}'.format(page)
+                    self.archive.store('rarity', page_id, self.date, html)
+                if EXTRACTION_MODE == 'script':
+                    yield self.extract_rows(driver, start)
+                else:
+                    yield self.listings_from_html(html)
+
+                read = driver.execute_script(TABLE_STATE_JS)[0]
+                how = self.next_page(driver)
+                if how is None:
+                    break
+                # A new page replaces the rows; a scroll appends to the ones already read
+                start = read if how == 'scroll' else 0
+        finally:
+            self.close_page(driver)
+
+    def process_listings(self, listings, today=None):
+        """
+        Turns listings' raw text into records, parsing all price and release text in one batch
+
+        Args:
+            listings (list of Rarity_PageElement): table rows with a name
+            today (datetime.date): day the listings were scraped, defaults to today
+
+        Returns:
+            list of RarityRecord: one row for each listing
+        """
+        day = (today or datetime.date.today()).strftime('%Y-%m-%d')
+        parsed = parse_batch([l.price_text for l in listings], [l.release_text for l in listings],
+            today, [l.name for l in listings])
+
+        records = []
+        for listing, fields in zip(listings, parsed):
+            dataobject = Rarity_NFTData(listing.name, today)
+            dataobject.import_links(listing)
+            dataobject.import_parsed(fields)
+            records.append(dataobject.asRecord(day))
+        return records
+
+    def listing_changed(self, listing):
+        """
+        Compares a listing with its stored fingerprint, logging what changed
+        Queues the new fingerprint for dump_fingerprints()
+
+        Args:
+            listing (Rarity_PageElement): one table row
+
+        Returns:
+            bool: False if the listing is identical to the last time it was parsed
+        """
+        fingerprint = listing.fingerprint(PARSER_VERSION)
+        known = self.fingerprints.get(listing.name)
+        relative = any(w in listing.release_text.lower() for w in RELATIVE_DATE_WORDS)
+        if known and known['fingerprint'] == fingerprint and not relative:
+            return False
+
+        cells = listing.raw_cells()
+        if known and DIFF_LOGGING:
+            old_cells = json.loads(known['cells']) if known['cells'] else [None] * len(cells)
+            for field, old, new in zip(CELL_NAMES, old_cells, cells):
+                if old != new:
+                    print('{}: {} changed {!r} -> {!r}'.format(listing.name, field, old, new))
+
+        self.new_fingerprints[listing.name] = {'name': listing.name, 'fingerprint': fingerprint,
+            'cells': json.dumps(cells), 'last_changed': self.date}
+        return True
+
+    def stream_upcoming(self, batch_size=BATCH_SIZE):
+        """
+        Runs a new batch of data collection from the 'Upcoming' page, page by page
+        Listings unchanged since their stored fingerprint are not parsed, only noted for dump_unchanged();
+        collect them after each batch so they never pile up
+
+        Args:
+            batch_size (int): changed listings to parse and yield together
+
+        Yields:
+            list of RarityRecord: up to batch_size records, as soon as their pages have loaded;
+                empty when batch_size unchanged listings are waiting to be collected
+        """
+        changed = []
+        for listings in self.read_listings():
+            for listing in listings:
+                if not listing.name:
+                    continue
+                if self.listing_changed(listing):
+                    changed.append(listing)
+                else:
+                    self.unchanged.append(listing.name)
+            while len(changed) >= batch_size:
+                yield self.process_listings(changed[:batch_size])
+                changed = changed[batch_size:]
+            if len(self.unchanged) >= batch_size:
+                yield []
+        if changed:
+            yield self.process_listings(changed)
 
     def scrape_upcoming(self):
         """
         Runs a new batch of data collection from the 'Upcoming' page
-        Populates self.NFTs with the data found
+        Populates self.NFTs with all the data found, see stream_upcoming()
         """
-        self.make_soup()
-        if self.soup:
+        for records in self.stream_upcoming():
+            self.NFTs.extend(records)
 
-            content_trs = self.soup.find_all("tr", "text-left", "text-gray-800")
-            for tr in content_trs:
-                # Gather html data
-                listing = Rarity_PageElement(tr)
+    def dump_unchanged(self):
+        """
+        Hands back listings skipped because they have not changed; each is only handed back once
 
-                if len(listing.name) > 0:
-                    
-                    # Process html data
-                    dataobject = Rarity_NFTData(listing.name)
-                    dataobject.import_from_rarity_page_element(listing)
-                    
-                    # Record data
-                    self.NFTs.append(dataobject.asDict())
+        Returns:
+            list (str): names of the listings
+        """
+        unchanged = self.unchanged
+        self.unchanged = []
+        return unchanged
+
+    def dump_fingerprints(self, names=None):
+        """
+        Hands back fingerprints to store; each one is only handed back once,
+        so they can be written alongside the batch of records they belong to
+
+        Args:
+            names (list of str): only these listings' fingerprints, defaults to all of them
+
+        Returns:
+            list of dicts: fingerprints of new and changed listings, to store
+        """
+        if names is None:
+            names = list(self.new_fingerprints)
+        return [self.new_fingerprints.pop(n) for n in names if n in self.new_fingerprints]
 
     def dump_data(self):
         """
         Returns:
-            list of dicts: self.NFTs containing all scraped data
+            list of RarityRecord: self.NFTs containing all scraped data
         """
         return self.NFTs
\ No newline at end of file
@@ -3,8 +3,19 @@ import datetime
 import os
 
 from Rarity_PageElement import Rarity_PageElement
+from Records import RarityRecord
 
 PARSE_UPDATES = True
+# Part of every listing fingerprint; bump it whenever parse_price or parse_release_date changes,
+# so listings skipped as unchanged are parsed again with the fix
+PARSER_VERSION = 1
+
+# Compiled once and shared by every listing
+PRICE_PATTERN = re.compile(r"([\d\.]+)([\s]*)([A-Z]{3,})")
+DATE_PATTERN = re.compile(r"([a-z]+), ([a-z]+) (\d{1,2}[a-z]{2}) (\d{4})")
+TIME_PATTERN = re.compile(r"([\d\:]{4,5})\s+(am|pm)\s+(\([\w|/]+\))\s*")
+MONTHS = {"january":1, "february":2, "march":3, "april":4, "may":5, "june":6,
+    "july":7, "august":8, "september":9, "october":10, "november":11, "december":12}
 
 class Rarity_NFTData:
     """
@@ -13,8 +24,14 @@ class Rarity_NFTData:
     is to process raw text into usable pieces of data.
     """
 
-    def __init__(self, name):
+    def __init__(self, name, today=None):
+        """
+        Args:
+            name (str): project name
+            today (datetime.date): day the listing was scraped, for 'today'/'tomorrow' release text
+        """
         self.name = name
+        self.today = today or datetime.date.today()
         self.release_date = None
         self.release_price = None
         self.presale_date = None
@@ -59,6 +76,18 @@ class Rarity_NFTData:
         d['website'] = self.website
         return d
 
+    def asRecord(self, date):
+        """
+        Args:
+            date (str): scrape date as YYYY-MM-DD
+
+        Returns:
+            RarityRecord: this project's data as a row of rarity_scraped_data
+        """
+        return RarityRecord(self.name, date, self.release_date, self.release_price,
+            self.presale_date, self.presale_price, self.quantity, self.currency,
+            self.twitter_id, self.discord_id, self.website)
+
     def discord_user_from_url(self, url):
         user = url.split("/")[-1]
         return user
@@ -78,13 +107,13 @@ class Rarity_NFTData:
             tuple (float, str): value, currency
         """
         error = ''
-        if ('tbd' in s.lower()) or ('tba' in s.lower()):
+        lower = s.lower()
+        if ('tbd' in lower) or ('tba' in lower):
             result = None, None
-        elif 'free' in s.lower():
+        elif 'free' in lower:
             result = 0, None
         else:
-            pattern = r"([\d\.]+)([\s]*)([A-Z]{3,})"
-            match = re.search(pattern, s)
+            match = PRICE_PATTERN.search(s)
             if match:
                 try:
                     price = float(match.group(1))
@@ -127,12 +156,7 @@ class Rarity_NFTData:
             print(error)
 
     def month_to_int(self, s):
-        months = {"january":1, "february":2, "march":3, "april":4, "may":5, "june":6, 
-        "july":7, "august":8, "september":9, "october":10, "november":11, "december":12}
-        if s.lower() in months:
-            return months[s]
-        else:
-            return -1
+        return MONTHS.get(s.lower(), -1)
 
     def parse_release_date(self, s):
         """
@@ -150,15 +174,14 @@ class Rarity_NFTData:
             return None
         
         if 'today' in s:
-            date_object = datetime.date.today()
+            date_object = self.today
         elif 'tomorrow' in s:
-            date_object = datetime.date.today() + datetime.timedelta(days=1)
+            date_object = self.today + datetime.timedelta(days=1)
         elif 'yesterday' in s:
-            date_object = datetime.date.today() - datetime.timedelta(days=1)
+            date_object = self.today - datetime.timedelta(days=1)
         else:
             # parse "friday, january 28th 2022"
-            date_pattern = r"([a-z]+), ([a-z]+) (\d{1,2}[a-z]{2}) (\d{4})"
-            match = re.search(date_pattern, s)
+            match = DATE_PATTERN.search(s)
             if match:
                 month = self.month_to_int(match.group(2))
                 day = int(match.group(3).strip('stndrth'))
@@ -171,8 +194,7 @@ class Rarity_NFTData:
                 return None
 
         # parse "8:00 am (america/vancouver)"
-        pattern = r"([\d\:]{4,5})\s+(am|pm)\s+(\([\w|/]+\))\s*"
-        match = re.search(pattern, s)
+        match = TIME_PATTERN.search(s)
         if match:
             time = match.group(1)
             ampm = match.group(2)
@@ -221,6 +243,17 @@ class Rarity_NFTData:
         """
         Import data from a RarityUpcomingListing object
 
+        Args:
+            listing: RarityUpcomingListing() object
+        """
+        self.import_links(listing)
+        self.extract_price_info(listing.price_text)
+        self.extract_release_info(listing.release_text)
+
+    def import_links(self, listing):
+        """
+        Import quantity, website and account ids from a RarityUpcomingListing object
+
         Args:
             listing: RarityUpcomingListing() object
         """
@@ -230,5 +263,90 @@ class Rarity_NFTData:
             self.discord_id = self.discord_user_from_url(listing.discordurl)
         if listing.twitterurl:
             self.twitter_id = self.twitter_user_from_url(listing.twitterurl)
-        self.extract_price_info(listing.price_text)
-        self.extract_release_info(listing.release_text)
+
+    def import_parsed(self, fields):
+        """
+        Import price and release values already parsed by parse_batch()
+
+        Args:
+            fields (dict): release_price, presale_price, currency, release_date, presale_date
+        """
+        self.release_price = fields['release_price']
+        self.presale_price = fields['presale_price']
+        self.currency = fields['currency']
+        self.release_date = fields['release_date']
+        self.presale_date = fields['presale_date']
+
+def parse_batch(price_texts, release_texts, today=None, names=None):
+    """
+    Parses the price and release text of many listings at once
+    Many listings share the same text ('TBA', a popular launch day), so each
+    distinct string is parsed only once per batch
+
+    Args:
+        price_texts (list of str): raw price text of each listing
+        release_texts (list of str): raw release text of each listing
+        today (datetime.date): day the listings were scraped, defaults to today
+        names (list of str): listing names, used in error messages
+
+    Returns:
+        list of dicts: release_price, presale_price, currency, release_date, presale_date
+            for each listing, in order
+    """
+    today = today or datetime.date.today()
+    names = names or [None] * len(price_texts)
+    price_memo = {}
+    release_memo = {}
+    results = []
+
+    for name, price_text, release_text in zip(names, price_texts, release_texts):
+        if price_text not in price_memo:
+            data = Rarity_NFTData(name, today)
+            data.extract_price_info(price_text)
+            price_memo[price_text] = (data.release_price, data.presale_price, data.currency)
+        if release_text not in release_memo:
+            data = Rarity_NFTData(name, today)
+            data.extract_release_info(release_text)
+            release_memo[release_text] = (data.release_date, data.presale_date)
+
+        release_price, presale_price, currency = price_memo[price_text]
+        release_date, presale_date = release_memo[release_text]
+        results.append({'release_price': release_price, 'presale_price': presale_price,
+            'currency': currency, 'release_date': release_date, 'presale_date': presale_date})
+    return results
+
+def benchmark(rows):
+    """
+    Compares parsing listings one at a time against parse_batch()
+
+    Args:
+        rows (list of tuples (str)): price text, release text
+
+    Returns:
+        tuple (float): rows per second one at a time, rows per second in a batch
+    """
+    import time
+
+    today = datetime.date.today()
+    start = time.perf_counter()
+    for price_text, release_text in rows:
+        data = Rarity_NFTData(None, today)
+        data.extract_price_info(price_text)
+        data.extract_release_info(release_text)
+    single = time.perf_counter() - start
+
+    start = time.perf_counter()
+    parse_batch([r[0] for r in rows], [r[1] for r in rows], today)
+    batch = time.perf_counter() - start
+    return len(rows) / single, len(rows) / batch
+
+if __name__ == '__main__':
+    # Typical rarity.tools text; real pages repeat these strings heavily
+    PARSE_UPDATES = False
+    prices = ['TBA', 'Free', '0.05 ETH', '0.08 ETH\n0.1 ETH', 'Free\n2 SOL', '1.5 SOL', '0.069 ETH']
+    releases = ['TBA\n', 'Today\n', 'Friday, March 4th 2022\n',
+        'Presale\n8:00 am (America/Vancouver) Friday, January 28th 2022\nSale\n12:00 pm (America/Vancouver) Saturday, January 29th 2022\n']
+    rows = [(prices[i % len(prices)], releases[i % len(releases)]) for i in range(20000)]
+    single, batch = benchmark(rows)
+    print('one at a time: {:,.0f} rows/s'.format(single))
+    print('parse_batch:   {:,.0f} rows/s ({:.1f}x)'.format(batch, batch / single))
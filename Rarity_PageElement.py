@@ -1,4 +1,7 @@
-from bs4.element import Tag
+import hashlib
+import json
+
+from HtmlParser import child_tags
 
 
 class Rarity_PageElement:
@@ -9,12 +12,12 @@ class Rarity_PageElement:
     the Rarity_NFTData class.
     """
 
-    def __init__(self, html):
+    def __init__(self, html=None):
         """
         When HTML is passed in, process all information
 
         Args:
-            html (bs4.elementTag): object containing a <tr></tr> html tree
+            html (bs4.elementTag): object containing a <tr></tr> html tree, optional
         """
         self.html = html
 
@@ -28,7 +31,28 @@ class Rarity_PageElement:
         self.twitterurl = None
         self.website = None
 
-        self.process_html()
+        if html is not None:
+            self.process_html()
+
+    @classmethod
+    def from_row(cls, row):
+        """
+        Builds a listing from a row extracted in the browser by RarityScraper
+
+        Args:
+            row (list): [title, [link hrefs], price text, total text, release text]
+
+        Returns:
+            Rarity_PageElement: the listing, without html
+        """
+        listing = cls()
+        title, links, price_text, total_text, release_text = row
+        listing.name = listing.to_string(title.strip())
+        listing.read_links([listing.to_string(x) for x in links])
+        listing.price_text = price_text.strip()
+        listing.read_quantity(total_text.strip())
+        listing.release_text = release_text
+        return listing
 
     def display_pretty(self):
         """
@@ -44,6 +68,25 @@ class Rarity_PageElement:
         print("Release Info: {}".format(self.release_text))
         print("--------------------------------------------")
 
+    def raw_cells(self):
+        """
+        Returns:
+            list: the listing's raw text, exactly as read from the page
+        """
+        return [self.name, self.discordurl, self.twitterurl, self.website,
+            self.quantity, self.price_text, self.release_text]
+
+    def fingerprint(self, parser_version=0):
+        """
+        Args:
+            parser_version (int): version of the parsers that read the cells, hashed in too
+
+        Returns:
+            str: hash of the raw cells; equal fingerprints mean an unchanged listing
+        """
+        cells = json.dumps([parser_version, self.raw_cells()])
+        return hashlib.sha1(cells.encode('utf-8')).hexdigest()
+
     def to_string(self, s):	
         """
         Safe method to use instead of (str)
@@ -67,7 +110,7 @@ class Rarity_PageElement:
         Args:
             td (bs4.elementTag): object containing a <td></td> html tree
         """
-        divs = [x for x in td.contents if isinstance(x, Tag)]
+        divs = child_tags(td)
         title_div = divs[0]
         self.name = self.to_string(title_div.getText().strip())
 
@@ -78,17 +121,19 @@ class Rarity_PageElement:
         Args:
             td (bs4.elementTag): object containing a <td></td> html tree
         """
-        links = [x for x in td.contents if isinstance(x, Tag)]
+        links = [self.to_string(x.get("href")) for x in child_tags(td)]
+        self.read_links(links)
+
+    def read_links(self, links):
+        """
+        Sets discordurl, twitterurl, website from the link urls in the links cell
+
+        Args:
+            links (list of str): hrefs in the order they appear
+        """
         if len(links) == 3:
-            discord_link = links[0]
-            twitter_link = links[1]
-            website_link = links[2]
-            # Discord
-            self.discordurl = self.to_string(discord_link.get("href"))
-            # Twitter
-            self.twitterurl = self.to_string(twitter_link.get("href"))
-            # Website
-            self.website = self.to_string(website_link.get("href"))
+            # Discord, Twitter, Website
+            self.discordurl, self.twitterurl, self.website = links
         else:
             # Sometimes one link is missing
             # In this case, we can't determine the order, so leave unassigned
@@ -103,14 +148,22 @@ class Rarity_PageElement:
         Args:
             td (bs4.elementTag): object containing a <td></td> html tree
         """
-        data = [x for x in td.contents if isinstance(x, Tag)]
+        data = child_tags(td)
         price = data[0]
         count = data[1]
         # Price
         price_text = str(price.getText().strip())
         self.price_text = price_text
         # Quantity
-        total_text = str(count.getText().strip())
+        self.read_quantity(str(count.getText().strip()))
+
+    def read_quantity(self, total_text):
+        """
+        Sets quantity from text in the format "10,000 Total"
+
+        Args:
+            total_text (str): stripped text of the quantity element
+        """
         if " Total" in total_text:
             number_text = total_text.split(" Total")[0].replace(",", "")
             if number_text:
@@ -123,7 +176,7 @@ class Rarity_PageElement:
         Args:
             td (bs4.elementTag): object containing a <td></td> html tree
         """
-        divs = [x for x in td.contents if isinstance(x, Tag)]
+        divs = child_tags(td)
         text = ""
         for div in divs:
             text += str(div.getText())
@@ -134,7 +187,7 @@ class Rarity_PageElement:
         """
         Break the main chunk of html into smaller pieces
         """
-        tds = [x for x in self.html.contents if isinstance(x, Tag)]
+        tds = child_tags(self.html)
         title_cell = tds[0]
         links_cell = tds[1]
         data_cell = tds[2]
@@ -0,0 +1,30 @@
+"""
+Row types for each table, from the scrapers through to the database
+
+Records are namedtuples: no per-row dict, and the field order is the column
+order used by DatabaseManager when inserting them.
+Optional fields default to None, which is stored as NULL.
+"""
+
+from collections import namedtuple
+
+ProjectRecord = namedtuple('ProjectRecord',
+    ['name', 'release_date', 'twitter_id', 'discord_id', 'quantity', 'status', 'rank'],
+    defaults=[None] * 6)
+
+RarityRecord = namedtuple('RarityRecord',
+    ['name', 'date', 'release_date', 'release_price', 'presale_date', 'presale_price',
+    'quantity', 'currency', 'twitter_id', 'discord_id', 'website'],
+    defaults=[None] * 9)
+
+TwitterRecord = namedtuple('TwitterRecord',
+    ['twitter_id', 'date', 'followers', 'following', 'activity'],
+    defaults=[None] * 3)
+
+DiscordRecord = namedtuple('DiscordRecord',
+    ['discord_id', 'date', 'online', 'members', 'activity'],
+    defaults=[None] * 3)
+
+OpenseaRecord = namedtuple('OpenseaRecord',
+    ['name', 'date', 'price', 'highest_last_sale', 'lowest_price'],
+    defaults=[None] * 3)
@@ -0,0 +1,108 @@
+import heapq
+import random
+import time
+from collections import deque
+
+ATTEMPTS = 2
+BASE_DELAY = 2      # seconds before the first retry
+MAX_DELAY = 60      # longest wait between retries
+JITTER = 0.5        # delays vary by +/- this fraction
+
+# Why an attempt failed
+LOAD_FAILURE = 'load failure'       # the url could not be opened
+TIMEOUT = 'timeout'                 # the page never showed the data we wait for
+PARSE_FAILURE = 'parse failure'     # the page loaded but the data could not be read
+NOT_FOUND = 'not found'             # the account or invite does not exist
+
+# Failures that will not go away by trying again
+DEAD_REASONS = [NOT_FOUND]
+
+class RetryQueue:
+    """
+    A work queue that retries failed items with jittered exponential backoff
+    Retries that are due are handed out ahead of fresh work, and fresh work
+    keeps flowing while retries wait, so one slow item never stalls the batch
+    """
+    def __init__(self, items, attempts=ATTEMPTS, base_delay=BASE_DELAY, max_delay=MAX_DELAY, clock=time.time, sleep=time.sleep):
+        """
+        Args:
+            items (list of str): ids to process
+            attempts (int): times to try each id before giving up
+            base_delay (float): seconds to wait before the first retry
+            max_delay (float): longest wait between retries
+            clock (function): returns the current time in seconds
+            sleep (function): waits a number of seconds
+        """
+        self.fresh = deque(items)
+        self.retries = []
+        self.attempts = attempts
+        self.base_delay = base_delay
+        self.max_delay = max_delay
+        self.clock = clock
+        self.sleep = sleep
+        self.tries = {}
+        self.reasons = {}
+        self.failures = []
+        self.done = 0
+        self.total = len(items)
+        self.counter = 0
+
+    def __len__(self):
+        return len(self.fresh) + len(self.retries)
+
+    def pop(self):
+        """
+        Hands out the next id, waiting for a retry to come due if nothing else is left
+
+        Returns:
+            str: the next id, or None when the queue is empty
+        """
+        if self.retries and (self.retries[0][0] <= self.clock() or not self.fresh):
+            ready_at, _, item = heapq.heappop(self.retries)
+            wait = ready_at - self.clock()
+            if wait > 0:
+                self.sleep(wait)
+            return item
+        if self.fresh:
+            return self.fresh.popleft()
+        return None
+
+    def delay(self, tries):
+        """
+        Args:
+            tries (int): attempts made so far
+
+        Returns:
+            float: seconds to wait before the next attempt
+        """
+        delay = min(self.max_delay, self.base_delay * 2 ** (tries - 1))
+        return delay * random.uniform(1 - JITTER, 1 + JITTER)
+
+    def succeeded(self, item):
+        """
+        Marks an id as finished
+
+        Args:
+            item (str): id that succeeded
+        """
+        self.tries[item] = self.tries.get(item, 0) + 1
+        self.done += 1
+
+    def failed(self, item, reason):
+        """
+        Records a failed attempt and schedules a retry if one is worthwhile
+
+        Args:
+            item (str): id that failed
+            reason (str): why it failed, one of the reasons above
+        """
+        self.tries[item] = self.tries.get(item, 0) + 1
+        self.reasons.setdefault(item, []).append(reason)
+
+        if reason in DEAD_REASONS or self.tries[item] >= self.attempts:
+            self.failures.append(item)
+            self.done += 1
+        else:
+            self.counter += 1
+            ready_at = self.clock() + self.delay(self.tries[item])
+            heapq.heappush(self.retries, (ready_at, self.counter, item))
@@ -0,0 +1,109 @@
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+WORKERS = 4
+ATTEMPTS = 2
+
+class ScraperPool:
+    """
+    Runs a user scraper (TwitterScraper, DiscordScraper) across several Chrome browsers at once.
+    The user list is split between workers, each worker drives its own browser,
+    and the results are merged back into a single scraper-shaped result.
+    """
+    def __init__(self, scraper_class, users, workers=WORKERS, session=None, archive=None, sink=None):
+        """
+        Args:
+            scraper_class (class): TwitterScraper or DiscordScraper
+            users (list of str): usernames to scrape
+            workers (int): number of browsers to run in parallel
+            session (BrowserSession): shared browsers to borrow from, optional
+            archive (PageArchive): where to keep fetched pages, optional
+            sink (DatabaseWriter): where workers send records as they are scraped, optional
+        """
+        self.scraper_class = scraper_class
+        self.users = users
+        self.session = session
+        self.archive = archive
+        self.sink = sink
+        self.workers = max(1, min(workers, len(users)))
+        self.data = []
+        self.failure_reasons = {}
+        self.stats = []
+
+    def split_users(self):
+        """
+        Splits the user list into one chunk per worker
+
+        Returns:
+            list of lists (str): usernames for each worker
+        """
+        return [self.users[i::self.workers] for i in range(self.workers)]
+
+    def run_worker(self, worker, users, tries):
+        """
+        Scrapes one chunk of users on its own browser
+
+        Args:
+            worker (int): worker number, used for reporting
+            users (list of str): usernames to scrape
+            tries (int): number of times to load each user in case of failure
+
+        Returns:
+            tuple: (scraper object, failed usernames, seconds elapsed)
+        """
+        scraper = self.scraper_class(users, session=self.session, archive=self.archive, sink=self.sink)
+        scraper.label = 'Worker {} '.format(worker)
+        start = time.time()
+        failures = scraper.batch_scrape(tries)
+        elapsed = time.time() - start
+        return scraper, failures, elapsed
+
+    def batch_scrape(self, tries=ATTEMPTS):
+        """
+        Runs a new batch of data collection on all workers
+
+        Args:
+            tries (int): number of times to load each user in case of failure
+
+        Returns:
+            list (str): users that failed after all tries, across all workers
+        """
+        if not self.users:
+            return []
+
+        chunks = self.split_users()
+        if self.session:
+            self.session.warm(self.workers)
+        failures = []
+        with ThreadPoolExecutor(max_workers=self.workers) as executor:
+            futures = [executor.submit(self.run_worker, i+1, chunk, tries) for i, chunk in enumerate(chunks)]
+            for i, future in enumerate(futures):
+                scraper, worker_failures, elapsed = future.result()
+                if self.sink is None:
+                    self.data.extend(scraper.dump_data())
+                self.failure_reasons.update(scraper.failure_reasons)
+                failures.extend(worker_failures)
+                self.stats.append({'worker': i+1, 'users': len(chunks[i]), 'failures': len(worker_failures), 'seconds': elapsed})
+
+        self.report()
+        return failures
+
+    def report(self):
+        """
+        Prints the throughput of each worker
+        """
+        print('\n====== Worker throughput ======')
+        for s in self.stats:
+            rate = s['users'] / s['seconds'] if s['seconds'] else 0
+            print('Worker {}: {} users, {} failures, {:.1f}s ({:.2f} users/s)'.format(
+                s['worker'], s['users'], s['failures'], s['seconds'], rate))
+        wall = max(s['seconds'] for s in self.stats)
+        print('Total: {} users in {:.1f}s ({:.2f} users/s)'.format(
+            len(self.users), wall, len(self.users) / wall if wall else 0))
+
+    def dump_data(self):
+        """
+        Returns:
+            list of records: all scraped data from every worker, empty if a sink was given
+        """
+        return self.data
@@ -3,121 +3,315 @@ string = datetime_object.strftime('%Y-%m-%d')
 datetime_object = datetime.datetime.strptime(string, '%Y-%m-%d')
 """
 
+from concurrent.futures import ProcessPoolExecutor
 from datetime import date
 
-from DatabaseManager import DatabaseManager
+from BrowserSession import BrowserSession
+from ColumnStore import ColumnStore
+from ConnectionPool import ConnectionPool
+from DatabaseManager import DatabaseManager, DB_FILE
+from DatabaseWriter import DatabaseWriter
+from HtmlParser import PARSE_TIMES
+from PageArchive import PageArchive, load_page
+from Records import ProjectRecord, TwitterRecord, DiscordRecord
 
 from RarityScraper import RarityScraper
 from TwitterScraper import TwitterScraper
 from DiscordScraper import DiscordScraper
 from OpenseaScraper import OpenseaScraper
+from ScraperPool import ScraperPool
+
+WORKERS = 4
+RARITY_BATCH_SIZE = 100     # rarity records written per commit
+# Sources whose fetched pages are kept, so parser fixes can be replayed with replay_archive
+# Twitter, discord and opensea parse page_source anyway, so archiving them only costs compression.
+# Rarity is off: its rows are read by one in-browser script, and archiving would serialize them all as well
+ARCHIVE_PAGES = {
+    'rarity': False,
+    'twitter': True,
+    'discord': True,
+    'opensea': True,
+}
+REFRESH_COLUMNS = True  # bring the ColumnStore copy for analytics up to date after writing
 
 def _today():
     return date.today().strftime('%Y-%m-%d')
 
-def scrape_rarity(dm):
+def scrape_rarity(dm, session=None, archive=None):
     """
     Runs the rarity scraper
-    Records data into database
+    Records data into database, committing each batch as the pages load
     Args:
         dm: DatabaseManager object
+        session (BrowserSession): shared browsers, optional
+        archive (PageArchive): where to keep fetched pages, optional
     """
     today = _today()
     print('\nRarity Scrape {}'.format(today))
 
-    rscraper = RarityScraper()
-    rscraper.scrape_upcoming()
-    data = rscraper.dump_data()
-    
-    for d in data:
-        d['date'] = today
-        dm.enter_rarity_record(d)
-        
-        master_project_keys = ['name', 'release_date', 'twitter_id', 'discord_id', 'quantity']
-        master_project_data = {k:d[k] for k in master_project_keys}
-        dm.enter_project(master_project_data)
+    fingerprints = dm.get_rarity_fingerprints()
+    rscraper = RarityScraper(session, archive, fingerprints)
+
+    # Each batch is committed as soon as its page has loaded, along with its fingerprints
+    # Unchanged listings keep yesterday's parsed values, copied forward batch by batch
+    changed = 0
+    unchanged = 0
+    projects = {'inserted': 0, 'updated': 0, 'unchanged': 0}
+    for records in rscraper.stream_upcoming(RARITY_BATCH_SIZE):
+        dm.enter_records('rarity_scraped_data', records)
+        counts = dm.enter_projects([ProjectRecord(r.name, r.release_date, r.twitter_id, r.discord_id, r.quantity) for r in records])
+        for k in projects:
+            projects[k] += counts[k]
+        for f in rscraper.dump_fingerprints([r.name for r in records]):
+            dm.enter_rarity_fingerprint(f)
+        names = rscraper.dump_unchanged()
+        dm.carry_forward_rarity_records(names, today)
+        dm.commit()
+        changed += len(records)
+        unchanged += len(names)
+
+    names = rscraper.dump_unchanged()
+    dm.carry_forward_rarity_records(names, today)
+    for f in rscraper.dump_fingerprints():
+        dm.enter_rarity_fingerprint(f)
+    dm.commit()
+    unchanged += len(names)
+    print('{} listings changed, {} unchanged'.format(changed, unchanged))
+    print('Projects: {inserted} inserted, {updated} updated, {unchanged} unchanged'.format(**projects))
 
-def scrape_twitter(dm, user_list):
+def scrape_twitter(dm, user_list, session=None, archive=None):
     """
     Runs the twitter scraper on a list of usernames
-    Records data into database
+    Records data into database while scraping, through a DatabaseWriter
     Corrects any incorrect usernames found along the way
     Args:
         dm (DatabaseManager object): db handle for entering data
         user_list (list of str): Twitter usernames to scrape
+        session (BrowserSession): shared browsers, optional
+        archive (PageArchive): where to keep fetched pages, optional
     """
     today = _today()
     print('\nTwitter Scrape {}'.format(today))
 
-    tscraper = TwitterScraper(user_list)
-    failed_ids = tscraper.batch_scrape()
-    data = tscraper.dump_data()
+    # Users checkpointed by an interrupted run today are not scraped again
+    finished = dm.get_finished_ids(today, 'twitter')
+    if finished:
+        print('Resuming: {} users already done'.format(len(finished)))
+    user_list = [u for u in user_list if u not in finished]
 
-    for d in data:
-        d['date'] = today
-        dm.enter_twitter_record(d)
+    # The writer commits on its own connection, so nothing can be left uncommitted here
+    dm.commit()
+    writer = DatabaseWriter(progress=(today, 'twitter'), pool=dm.pool)
+    tscraper = ScraperPool(TwitterScraper, user_list, WORKERS, session, archive, writer)
+    try:
+        failed_ids = tscraper.batch_scrape()
+    finally:
+        written = writer.close()
+    print('{} records written'.format(written))
 
     dm.remove_twitter_ids(failed_ids)
+    dm.enter_finished_ids(today, 'twitter', failed_ids)
 
-def scrape_discord(dm, user_list):
+def scrape_discord(dm, user_list, session=None, archive=None):
     """
     Runs the discord scraper on a list of usernames
-    Records data into database
+    Records data into database while scraping, through a DatabaseWriter
     Corrects any incorrect usernames found along the way
     Args:
         dm (DatabaseManager object): db handle for entering data
         user_list (list of str): Discord usernames to scrape
+        session (BrowserSession): shared browsers, optional
+        archive (PageArchive): where to keep fetched pages, optional
     """
     today = _today()
     print('\nDiscord Scrape {}'.format(today))
 
-    dscraper = DiscordScraper(user_list)
-    failed_ids = dscraper.batch_scrape()
-    data = dscraper.dump_data()
+    # Users checkpointed by an interrupted run today are not scraped again
+    finished = dm.get_finished_ids(today, 'discord')
+    if finished:
+        print('Resuming: {} users already done'.format(len(finished)))
+    user_list = [u for u in user_list if u not in finished]
 
-    for d in data:
-        d['date'] = today
-        dm.enter_discord_record(d)
+    # The writer commits on its own connection, so nothing can be left uncommitted here
+    dm.commit()
+    writer = DatabaseWriter(progress=(today, 'discord'), pool=dm.pool)
+    dscraper = ScraperPool(DiscordScraper, user_list, WORKERS, session, archive, writer)
+    try:
+        failed_ids = dscraper.batch_scrape()
+    finally:
+        written = writer.close()
+    print('{} records written'.format(written))
 
     dm.remove_discord_ids(failed_ids)
+    dm.enter_finished_ids(today, 'discord', failed_ids)
 
-def scrape_opensea(dm, project_list):
+def scrape_opensea(dm, project_list, session=None, archive=None):
     """
     Runs the opensea scraper on a list of project names
-    Records data into database
+    Records data into database while scraping, through a DatabaseWriter
     For unfound projects, mark status as inactive
     Args:
         dm (DatabaseManager object): db handle for entering data
         project_list (list of str): NFT project names to scrape
+        session (BrowserSession): shared browsers, optional
+        archive (PageArchive): where to keep fetched pages, optional
     """
     today = _today()
     print('\nOpensea Scrape {}'.format(today))
 
-    oscraper = OpenseaScraper(project_list)
-    failed_ids = oscraper.batch_scrape()
+    metadata = dm.get_project_metadata(project_list)
+    slugs = dm.get_opensea_slugs()
+    dm.commit()
+    writer = DatabaseWriter(pool=dm.pool)
+    oscraper = OpenseaScraper(project_list, session, metadata, slugs, archive, writer)
+    try:
+        failed_ids = oscraper.batch_scrape()
+    finally:
+        written = writer.close()
+    print('{} records written'.format(written))
+
+    for s in oscraper.dump_slugs():
+        dm.enter_opensea_slug(s)
+
+def run_stage(dm, stage, scrape, *args):
+    """
+    Runs one stage of the daily scrape unless it already finished today
+    Stages commit as they go and are checkpointed when done, so an interrupted
+    run picks up where it stopped when it is started again the same day
+
+    Args:
+        dm (DatabaseManager object): db handle for entering data
+        stage (str): name the stage is checkpointed under
+        scrape (function): one of the scrape_ functions above
+        *args: passed on to scrape after dm
+    """
+    today = _today()
+    if dm.stage_finished(today, stage):
+        print('\n{} already finished for {}, skipping'.format(stage, today))
+        return
+    scrape(dm, *args)
+    dm.finish_stage(today, stage)
+    dm.commit()
 
 def daily_scrape():
     """
     Runs all scrapers and records data in database
-    Note: Because the entire daily scrape happens in one transaction,
-        pre/post release filters are based on yesterday
+    Every stage commits in chunks and is checkpointed in job_progress/job_stages,
+        so rerunning after a crash only does the remaining work
+    Browsers are shared between stages through one BrowserSession,
+        and database connections through one ConnectionPool
     """
     today = _today()
-    dm = DatabaseManager()
-    dm.begin_transaction()
+    pool = ConnectionPool(DB_FILE)
+    try:
+        dm = DatabaseManager(pool=pool)
+        dm.begin_transaction()
+        session = BrowserSession()
+        archive = PageArchive() if any(ARCHIVE_PAGES.values()) else None
+        archives = {source: archive if on else None for source, on in ARCHIVE_PAGES.items()}
 
-    # Scrape project data
-    # scrape_rarity(dm)
+        try:
+            # Scrape project data
+            # run_stage(dm, 'rarity', scrape_rarity, session, archives['rarity'])
 
-    # twitter_ids_pre_release = dm.get_twitter_ids_pre_release(today)
-    # scrape_twitter(dm, twitter_ids_pre_release)
+            # twitter_ids_pre_release = dm.get_twitter_ids_pre_release(today)
+            # run_stage(dm, 'twitter', scrape_twitter, twitter_ids_pre_release, session, archives['twitter'])
 
-    # discord_ids_pre_release = dm.get_discord_ids_pre_release(today)
-    # scrape_discord(dm, discord_ids_pre_release)
+            # discord_ids_pre_release = dm.get_discord_ids_pre_release(today)
+            # run_stage(dm, 'discord', scrape_discord, discord_ids_pre_release, session, archives['discord'])
 
-    # Scrape prices
-    projects_post_release = dm.get_projects_post_release(today)
-    #TODO check why this is only returning 4
-    scrape_opensea(dm, projects_post_release)
+            # Scrape prices
+            projects_post_release = dm.get_projects_post_release(today)
+            #TODO check why this is only returning 4
+            run_stage(dm, 'opensea', scrape_opensea, projects_post_release, session, archives['opensea'])
+        except BaseException:
+            # Committed chunks and checkpoints are kept for the next run
+            dm.abort_transaction()
+            raise
+        finally:
+            session.close()
+            if archive:
+                archive.close()
+        PARSE_TIMES.report()
+
+        dm.clear_finished_ids(today)
+        dm.end_transaction()
+
+        if REFRESH_COLUMNS:
+            reader = DatabaseManager(readonly=True, pool=pool)
+            try:
+                ColumnStore().refresh_all(reader)
+            finally:
+                reader.close()
+    finally:
+        # Closes every pooled connection, on failure too
+        pool.close()
+
+def _reparse_page(job):
+    """
+    Re-parses one archived page with the current parsers; runs in a worker process
 
+    Args:
+        job (tuple): source, id, date, content hash
+
+    Returns:
+        list of namedtuples: records for the page's *_scraped_data table
+    """
+    source, id, day, digest = job
+    html = load_page(digest)
+
+    if source == 'twitter':
+        scraper = TwitterScraper([])
+        scraper.current_user = id
+        scraper.read_html(html)
+        followers, following = scraper.get_followers()
+        if followers > -1 and following > -1:
+            return [TwitterRecord(id, day, followers, following)]
+
+    elif source == 'discord':
+        scraper = DiscordScraper([])
+        scraper.current_user = id
+        scraper.read_html(html)
+        online, total = scraper.get_members()
+        if online > -1 and total > -1:
+            return [DiscordRecord(id, day, online, total)]
+
+    elif source == 'rarity':
+        scraper = RarityScraper()
+        listings = [l for l in scraper.listings_from_html(html) if l.name]
+        return scraper.process_listings(listings, date.fromisoformat(day))
+
+    return []
+
+def replay_archive(source, start_date, end_date, workers=None):
+    """
+    Re-parses archived pages without touching the network and rewrites their
+    *_scraped_data rows, so parser fixes can be applied to past days
+    Args:
+        source (str): 'rarity', 'twitter' or 'discord'
+        start_date (str): first day to replay, YYYY-MM-DD
+        end_date (str): last day to replay, YYYY-MM-DD
+        workers (int): parser processes, defaults to one per core
+    """
+    if source not in ['rarity', 'twitter', 'discord']:
+        raise ValueError('Cannot replay source: {}'.format(source))
+
+    archive = PageArchive()
+    jobs = [(source,) + page for page in archive.find(source, start_date, end_date)]
+    archive.close()
+    print('\nReplaying {} archived {} pages from {} to {}'.format(len(jobs), source, start_date, end_date))
+
+    dm = DatabaseManager()
+    dm.begin_transaction()
+    count = 0
+    with ProcessPoolExecutor(max_workers=workers) as executor:
+        for records in executor.map(_reparse_page, jobs, chunksize=16):
+            dm.enter_many(records)
+            count += len(records)
     dm.end_transaction()
+
+    if REFRESH_COLUMNS:
+        reader = DatabaseManager(readonly=True)
+        ColumnStore().refresh(reader, source + '_scraped_data', start_date)
+        reader.close()
+    print('Rewrote {} {} records'.format(count, source))
@@ -1,39 +1,203 @@
 import datetime
+import os
+import shutil
+import sys
+import tempfile
+import time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 import DatabaseManager
+from FeatureEngine import FeatureEngine, feature_names
 
 # All the pieces of data that might be used in calculations
 TWITTER_FIELDS = ['id', 'date', 'twitter_life_score', 'followers', 'following']
 DISCORD_FIELDS = ['id', 'date', 'discord_life_score', 'online', 'members']
-OPENSEA_FIELDS = ['name', 'date', 'price', 'highest_sale', 'lowest_sale']
+OPENSEA_FIELDS = ['name', 'date', 'price', 'highest_last_sale', 'lowest_price']
 PROJECT_FIELDS = ['name', 'release_date', 'twitter_id', 'discord_id', 'status', 'score']
 
+WORKERS = None          # evaluation processes, defaults to one per core
+SHARD_SIZE = 50         # projects scored per task; each task is one algorithm over one shard
+MIN_DAYS = 3            # days with both a score and a price needed to rate a project
+PRICE_LAG_DAYS = 0      # compare each day's score with the price this many days later
+
+def life_score(f):
+    """
+    Args:
+        f (dict): feature name -> (projects x days) array
+
+    Returns:
+        np.ndarray: mean of the twitter and discord life scores, whichever are known
+    """
+    with np.errstate(invalid='ignore'):
+        scores = np.stack([f['twitter_life_score'], f['discord_life_score']])
+        known = np.isfinite(scores).sum(axis=0)
+        return np.where(known > 0, np.nansum(scores, axis=0) / np.maximum(known, 1), np.nan)
+
+# Cherry score functions: feature name -> (projects x days) array, to a (projects x days) score
+# New functions are registered in master_prediction_algorithms as active the next time train() runs
+ALGORITHMS = {
+    'twitter_life': lambda f: f['twitter_life_score'],
+    'discord_life': lambda f: f['discord_life_score'],
+    'life': life_score,
+    'momentum': lambda f: f['followers_growth_7'] + f['members_growth_7'],
+    'acceleration': lambda f: f['followers_accel_7'] + f['members_accel_7'],
+}
+
+def correlations(scores, prices):
+    """
+    Pearson correlation of each project's score with its price, over the days both are known
+
+    Args:
+        scores (np.ndarray): one row per project, one column per day
+        prices (np.ndarray): same shape
 
-def train():
+    Returns:
+        np.ndarray: one value per project, NaN if it has fewer than MIN_DAYS or either side is flat
+    """
+    known = np.isfinite(scores) & np.isfinite(prices)
+    days = known.sum(axis=1)
+    with np.errstate(divide='ignore', invalid='ignore'):
+        s = np.where(known, scores, 0)
+        p = np.where(known, prices, 0)
+        s = np.where(known, s - (s.sum(axis=1) / days)[:, None], 0)
+        p = np.where(known, p - (p.sum(axis=1) / days)[:, None], 0)
+        spread = np.sqrt((s ** 2).sum(axis=1) * (p ** 2).sum(axis=1))
+        r = (s * p).sum(axis=1) / spread
+    r[(days < MIN_DAYS) | (spread == 0)] = np.nan
+    return r
+
+def _evaluate_shard(job):
+    """
+    Scores one algorithm over one shard of projects; runs in a worker process
+    Features and prices are memory-mapped, so every worker shares one copy of them
+
+    Args:
+        job (tuple): algorithm name, feature names, path of the feature values, path of the prices,
+            first project, last project + 1
+
+    Returns:
+        tuple: algorithm name, np.ndarray of correlations for the shard
+    """
+    algorithm, names, values_path, prices_path, start, stop = job
+    values = np.load(values_path, mmap_mode='r')
+    prices = np.load(prices_path, mmap_mode='r')
+    f = {name: np.asarray(values[i, start:stop]) for i, name in enumerate(names)}
+    scores = ALGORITHMS[algorithm](f)
+    prices = np.asarray(prices[start:stop])
+    if PRICE_LAG_DAYS:
+        scores = scores[:, :-PRICE_LAG_DAYS]
+        prices = prices[:, PRICE_LAG_DAYS:]
+    return algorithm, correlations(scores, prices)
+
+def evaluate(algorithms, names, values_path, prices_path, projects, workers=WORKERS):
+    """
+    Scores every (algorithm, project) pair, sharded across a process pool
+
+    Args:
+        algorithms (list of str): keys of ALGORITHMS
+        names (list of str): feature names, in the order they are stored
+        values_path (str): .npy of feature values, (features x projects x days)
+        prices_path (str): .npy of prices, (projects x days)
+        projects (int): number of projects
+        workers (int): processes, defaults to one per core; 1 scores in this process
+
+    Returns:
+        dict: algorithm name -> (mean correlation with price, number of projects scored)
+    """
+    jobs = [(a, names, values_path, prices_path, start, min(start + SHARD_SIZE, projects))
+        for a in algorithms for start in range(0, projects, SHARD_SIZE)]
+    if workers == 1:
+        results = list(map(_evaluate_shard, jobs))
+    else:
+        with ProcessPoolExecutor(max_workers=workers) as executor:
+            results = list(executor.map(_evaluate_shard, jobs))
+
+    scored = {a: [] for a in algorithms}
+    for algorithm, r in results:
+        scored[algorithm].append(r[np.isfinite(r)])
+
+    accuracy = {}
+    for algorithm, parts in scored.items():
+        r = np.concatenate(parts) if parts else np.empty(0)
+        accuracy[algorithm] = (float(r.mean()) if len(r) else None, len(r))
+    return accuracy
+
+def benchmark(projects=5000, days=365, worker_counts=None):
+    """
+    Times evaluate() on random data at several worker counts
+
+    Args:
+        projects (int): synthetic projects
+        days (int): synthetic days of history
+        worker_counts (list of int): defaults to 1, 2, 4, ... up to the number of cores
+    """
+    cores = os.cpu_count() or 1
+    worker_counts = worker_counts or sorted({min(2 ** i, cores) for i in range(cores.bit_length() + 1)})
+    rng = np.random.default_rng(0)
+    names = feature_names()
+    folder = tempfile.mkdtemp()
+    try:
+        values_path = os.path.join(folder, 'values.npy')
+        prices_path = os.path.join(folder, 'price.npy')
+        np.save(values_path, rng.normal(size=(len(names), projects, days)))
+        np.save(prices_path, rng.normal(size=(projects, days)))
+        for workers in worker_counts:
+            start = time.time()
+            evaluate(list(ALGORITHMS), names, values_path, prices_path, projects, workers)
+            print('{} workers: {} algorithms x {} projects x {} days in {:.2f}s'.format(workers,
+                len(ALGORITHMS), projects, days, time.time() - start))
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+def train(workers=WORKERS):
     """
     Uses post-released project data to test and improve the prediction algorithm
+    Each active algorithm is rated by how well its score follows price, averaged over projects
 
     Report all tests in logs
+
+    Args:
+        workers (int): evaluation processes, defaults to one per core
+
+    Returns:
+        dict: algorithm name -> (accuracy, number of projects scored)
     """
-    # Gather all data ??
-    functions = DatabaseManager.get("ALGORITHMS", "function", "status=active")
-    today = datetime.date.today()
-    t_data = DatabaseManager.get("TWITTER", TWITTER_FIELDS, "release_date<today")
-    d_data = DatabaseManager.get("DISCORD", DISCORD_FIELDS, "release_date<today")
-    o_data = DatabaseManager.get("OPENSEA", OPENSEA_FIELDS, "release_date<today")
-    p_data = DatabaseManager.get("PROJECT", PROJECT_FIELDS, "release_date<today")
-
-    #Test each function to see how well it correlates with price
-    for function in functions:
-        total_accuracy = 0
-        for project in projects:
-            #plot date x price
-            #plot date x cherry_score
-            #find correlation between the two
-            #rate algorithm based on correlation
-            total_accuracy += score
-        accuracy = total_accuracy / (len(projects))
-        DatabaseManager.enter("ALGORITHMS", [function,accuracy])
+    today = str(datetime.date.today())
+    dm = DatabaseManager.DatabaseManager()
+    dm.enter_algorithms(list(ALGORITHMS))
+    functions = [a for a in dm.get_active_algorithms() if a in ALGORITHMS]
+    dm.commit()
+
+    # Every released project's whole history, one row per project and one column per day
+    projects = dm.get_projects_post_release(today)
+    # Growth, slope, acceleration, online ratio and life scores, feature x project x day
+    features = FeatureEngine().compute(dm, projects, today)
+    if not projects or not len(features.days):
+        dm.end_transaction()
+        print('\nNo released projects with history to train on')
+        return {}
+    o_data = dm.get_series('opensea_scraped_data', ['price'], projects,
+        str(features.days[0]), str(features.days[-1]))
+
+    # Workers map the cached features and a copy of the prices instead of receiving them pickled
+    folder = tempfile.mkdtemp()
+    try:
+        prices_path = os.path.join(folder, 'price.npy')
+        np.save(prices_path, o_data.values['price'])
+        start = time.time()
+        results = evaluate(functions, features.names, features.values.filename, prices_path, len(projects), workers)
+    finally:
+        shutil.rmtree(folder, ignore_errors=True)
+
+    for function, (accuracy, count) in results.items():
+        print('{}: accuracy {} over {} projects'.format(function,
+            'n/a' if accuracy is None else '{:.3f}'.format(accuracy), count))
+    print('Evaluated {} algorithms x {} projects in {:.2f}s'.format(len(functions), len(projects), time.time() - start))
+    dm.enter_algorithm_results(results, today)
+    dm.end_transaction()
+    return results
 
 def predict_future():
     """
@@ -52,4 +216,12 @@ def predict_future():
 # accuracy of an algorithm changes every day
 # score of a project changes every day
 # how to record this? keep every date, overall average, or overwrite?
-# probably just overwrite as these scores are fluid and can always be reproduced
\ No newline at end of file
+# probably just overwrite as these scores are fluid and can always be reproduced
+
+if __name__ == '__main__':
+    # python prediction_algorithm.py [workers] : rate every active algorithm
+    # python prediction_algorithm.py benchmark [workers ...]
+    if len(sys.argv) > 1 and sys.argv[1] == 'benchmark':
+        benchmark(worker_counts=[int(w) for w in sys.argv[2:]] or None)
+    else:
+        train(int(sys.argv[1]) if len(sys.argv) > 1 else WORKERS)
@@ -1,11 +1,11 @@
-from datetime import datetime
-import os
-import shutil
+import sys
 
+from DatabaseBackup import DatabaseBackup
 from DatabaseManager import DB_FILE
 import data_collection
 import prediction_algorithm
 
+RESTARTS = 2    # times a crashed daily scrape is resumed before giving up
 
 def prompt_human_input():
     """
@@ -15,24 +15,31 @@ def prompt_human_input():
     pass
 
 def backup_db():
-    parts = DB_FILE.split('.')
-    a = '.'.join(parts[:-1])
-    b = parts[-1]
-    now = datetime.now().strftime('%Y%m%d')
-    backup_dir = f'./backup'
-
-    if not os.path.isdir(backup_dir):
-        os.mkdir(backup_dir)
-    backup_file = f'{backup_dir}/{a}_{now}.{b}'
-    shutil.copy(DB_FILE, backup_file)
+    """
+    Takes today's snapshot of the database into ./backup, storing only the pages that changed
+    Restore a day with: python DatabaseBackup.py restore cherry_<YYYYMMDD> <out_file>
+    """
+    backups = DatabaseBackup()
+    result = backups.snapshot(DB_FILE)
+    backups.close()
+    print('\nBackup {}: {} of {} pages new ({} KB)'.format(
+        result['name'], result['new_pages'], len(result['pages']), result['new_bytes'] // 1024))
 
 def main():
     """
     This is the main data collection function that runs daily, ideally automatically
     Gathers a large snapshot of objective data,
     As well as subjective human-entered data for a few selected projects
+    If the scrape crashes it is restarted, resuming from its last checkpoint
     """
-    data_collection.daily_scrape()
+    for attempt in range(RESTARTS + 1):
+        try:
+            data_collection.daily_scrape()
+            break
+        except Exception as e:
+            if attempt == RESTARTS:
+                raise
+            print('\nError: Daily scrape failed ({}), resuming from the last checkpoint'.format(e))
     # backup_db()
 
     # prediction_algorithm.train()
@@ -43,4 +50,8 @@ def main():
 
 
 if __name__ == '__main__':
-    main()
+    if len(sys.argv) > 1 and sys.argv[1] == 'replay':
+        # python run_daily.py replay <rarity|twitter|discord> <start YYYY-MM-DD> <end YYYY-MM-DD>
+        data_collection.replay_archive(sys.argv[2], sys.argv[3], sys.argv[4])
+    else:
+        main()
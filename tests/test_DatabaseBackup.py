@@ -0,0 +1,68 @@
+import json
+import sqlite3
+
+import pytest
+
+from DatabaseBackup import DatabaseBackup
+
+def dump(path):
+    conn = sqlite3.connect(path)
+    lines = list(conn.iterdump())
+    conn.close()
+    return lines
+
+def make_db(path, rows):
+    conn = sqlite3.connect(path)
+    conn.execute('PRAGMA journal_mode = WAL;')
+    conn.execute('CREATE TABLE twitter_scraped_data(twitter_id TEXT, date TEXT, followers INTEGER, PRIMARY KEY(twitter_id, date));')
+    conn.executemany('INSERT INTO twitter_scraped_data VALUES (?, ?, ?);',
+        [('user{}'.format(i), '2022-06-11', i) for i in range(rows)])
+    conn.commit()
+    return conn
+
+def test_snapshot_mutate_restore(tmp_path):
+    db = str(tmp_path / 'cherry.db')
+    conn = make_db(db, 5000)
+    original = dump(db)
+
+    backups = DatabaseBackup(str(tmp_path / 'backup'))
+    first = backups.snapshot(db, 'cherry_20220611')
+    assert first['new_pages'] == len(set(first['pages']))
+
+    conn.execute("UPDATE twitter_scraped_data SET followers = followers + 1 WHERE twitter_id = 'user7';")
+    conn.execute("DELETE FROM twitter_scraped_data WHERE twitter_id = 'user8';")
+    conn.commit()
+    changed = dump(db)
+    assert changed != original
+    second = backups.snapshot(db, 'cherry_20220612')
+    # Only the pages that changed are stored again
+    assert 0 < second['new_pages'] < len(second['pages'])
+    assert backups.snapshots() == ['cherry_20220611', 'cherry_20220612']
+
+    restored = str(tmp_path / 'restored.db')
+    backups.restore('cherry_20220611', restored)
+    assert dump(restored) == original
+    backups.restore('cherry_20220612', restored)
+    assert dump(restored) == changed
+    backups.close()
+    conn.close()
+
+def test_restore_rejects_mismatched_pages(tmp_path):
+    db = str(tmp_path / 'cherry.db')
+    make_db(db, 1000).close()
+    backups = DatabaseBackup(str(tmp_path / 'backup'))
+    backups.snapshot(db, 'cherry_20220611')
+
+    # Pages in the wrong order no longer match the manifest's whole-file hash
+    path = backups.manifest_path('cherry_20220611')
+    with open(path) as f:
+        manifest = json.load(f)
+    manifest['pages'][0], manifest['pages'][1] = manifest['pages'][1], manifest['pages'][0]
+    with open(path, 'w') as f:
+        json.dump(manifest, f)
+
+    restored = tmp_path / 'restored.db'
+    with pytest.raises(RuntimeError):
+        backups.restore('cherry_20220611', str(restored))
+    assert not restored.exists()
+    backups.close()
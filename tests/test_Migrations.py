@@ -0,0 +1,65 @@
+import sqlite3
+
+import pytest
+
+from Migrations import LATEST_VERSION, MIGRATIONS, current_version, migrate
+
+def names(conn, kind):
+    return {x[0] for x in conn.execute('SELECT name FROM sqlite_master WHERE type = ?;', (kind,))}
+
+def snapshot(conn, tables):
+    return {t: sorted(conn.execute('SELECT * FROM {};'.format(t)).fetchall(), key=repr) for t in tables}
+
+@pytest.fixture
+def baseline(tmp_path):
+    """
+    A database as it was before versioned migrations: migration 1's tables, user_version 0, some rows
+    """
+    conn = sqlite3.connect(str(tmp_path / 'cherry.db'))
+    for sql in MIGRATIONS[0][2]:
+        conn.execute(sql)
+    conn.executemany('INSERT INTO master_project_list VALUES (?, ?, ?, ?, ?, ?, ?);', [
+        ('Project A', '2022-06-20', 'project_a', 'abc123', 'upcoming', 1, 10000),
+        ('Project B', '', '', '', None, None, None),
+    ])
+    conn.executemany('INSERT INTO twitter_scraped_data VALUES (?, ?, ?, ?, ?);', [
+        ('project_a', '2022-06-11', 4628, 12, 3),
+        ('project_a', '2022-06-12', 4735, 12, None),
+    ])
+    conn.execute("INSERT INTO discord_scraped_data VALUES ('abc123', '2022-06-11', 120, 900, 5);")
+    conn.execute("""INSERT INTO rarity_scraped_data VALUES ('Project A', '2022-06-11', '2022-06-20', 0.08,
+        NULL, NULL, 10000, 'ETH', 'project_a', 'abc123', 'https://a.io');""")
+    conn.commit()
+    yield conn
+    conn.close()
+
+def test_migrate_twice(baseline):
+    assert current_version(baseline) == 0
+    old_tables = names(baseline, 'table')
+    before = snapshot(baseline, old_tables)
+    assert sum(len(rows) for rows in before.values())
+
+    assert migrate(baseline) == LATEST_VERSION
+    assert current_version(baseline) == LATEST_VERSION
+    tables = names(baseline, 'table')
+    assert {'opensea_scraped_data', 'master_opensea_slugs', 'master_rarity_fingerprints',
+        'job_progress', 'job_stages', 'master_prediction_algorithms'} <= tables
+    assert {'master_project_list_release_date', 'master_project_list_twitter_id',
+        'master_project_list_discord_id', 'rarity_scraped_data_date', 'twitter_scraped_data_date',
+        'discord_scraped_data_date', 'opensea_scraped_data_date'} <= names(baseline, 'index')
+    assert snapshot(baseline, old_tables) == before
+
+    # Already up to date, so nothing changes
+    schema = baseline.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name;').fetchall()
+    everything = snapshot(baseline, tables)
+    assert migrate(baseline) == LATEST_VERSION
+    assert current_version(baseline) == LATEST_VERSION
+    assert baseline.execute('SELECT type, name, sql FROM sqlite_master ORDER BY name;').fetchall() == schema
+    assert snapshot(baseline, tables) == everything
+
+def test_migrate_new_database(tmp_path):
+    conn = sqlite3.connect(str(tmp_path / 'new.db'))
+    assert migrate(conn) == LATEST_VERSION
+    assert current_version(conn) == LATEST_VERSION
+    assert 'master_project_list' in names(conn, 'table')
+    conn.close()
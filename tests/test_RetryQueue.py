@@ -0,0 +1,100 @@
+import random
+
+import RetryQueue
+from RetryQueue import RetryQueue as Queue, TIMEOUT, NOT_FOUND
+
+class FakeClock:
+    """
+    Stands in for time.time and time.sleep, so backoff waits take no real time
+    """
+    def __init__(self):
+        self.now = 0.0
+        self.slept = []
+
+    def time(self):
+        return self.now
+
+    def sleep(self, seconds):
+        self.slept.append(seconds)
+        self.now += seconds
+
+def run(queue, scrape):
+    """
+    Drives a queue the way TwitterScraper.traverse_batch does
+
+    Args:
+        queue (RetryQueue): queue under test
+        scrape (function): id -> failure reason, or None on success
+
+    Returns:
+        list (str): every id handed out, in order
+    """
+    handed_out = []
+    item = queue.pop()
+    while item is not None:
+        handed_out.append(item)
+        reason = scrape(item)
+        if reason:
+            queue.failed(item, reason)
+        else:
+            queue.succeeded(item)
+        item = queue.pop()
+    return handed_out
+
+def make_queue(items, attempts=3, base_delay=2, max_delay=60):
+    clock = FakeClock()
+    return Queue(items, attempts, base_delay, max_delay, clock=clock.time, sleep=clock.sleep), clock
+
+def test_delay_doubles_then_caps(monkeypatch):
+    monkeypatch.setattr(RetryQueue, 'JITTER', 0)
+    queue, _ = make_queue([], base_delay=2, max_delay=60)
+    assert [queue.delay(tries) for tries in range(1, 8)] == [2, 4, 8, 16, 32, 60, 60]
+
+def test_delay_jitter_stays_in_bounds():
+    random.seed(0)
+    queue, _ = make_queue([], base_delay=10, max_delay=60)
+    delays = [queue.delay(1) for _ in range(1000)]
+    assert min(delays) >= 10 * (1 - RetryQueue.JITTER)
+    assert max(delays) <= 10 * (1 + RetryQueue.JITTER)
+    assert len(set(delays)) > 1
+
+def test_retry_waits_for_backoff(monkeypatch):
+    monkeypatch.setattr(RetryQueue, 'JITTER', 0)
+    queue, clock = make_queue(['a'], attempts=4, base_delay=2)
+    run(queue, lambda item: TIMEOUT)
+    assert clock.slept == [2, 4, 8]
+
+def test_gives_up_after_max_attempts():
+    queue, _ = make_queue(['a', 'b'], attempts=3)
+    handed_out = run(queue, lambda item: TIMEOUT if item == 'a' else None)
+    assert handed_out.count('a') == 3
+    assert queue.failures == ['a']
+    assert queue.reasons['a'] == [TIMEOUT] * 3
+    assert queue.done == queue.total == 2
+    assert len(queue) == 0
+
+def test_dead_reasons_are_not_retried():
+    queue, clock = make_queue(['a'], attempts=3)
+    assert run(queue, lambda item: NOT_FOUND) == ['a']
+    assert queue.failures == ['a']
+    assert clock.slept == []
+
+def test_only_failed_ids_are_retried():
+    failing = {'b': 1, 'd': 2}
+    def scrape(item):
+        if failing.get(item):
+            failing[item] -= 1
+            return TIMEOUT
+        return None
+    queue, _ = make_queue(['a', 'b', 'c', 'd'], attempts=3)
+    handed_out = run(queue, scrape)
+    assert sorted(handed_out) == ['a', 'b', 'b', 'c', 'd', 'd', 'd']
+    assert queue.failures == []
+    assert queue.tries == {'a': 1, 'b': 2, 'c': 1, 'd': 3}
+
+def test_fresh_work_runs_while_retries_wait():
+    queue, clock = make_queue(['a', 'b', 'c'], attempts=2, base_delay=5)
+    handed_out = run(queue, lambda item: TIMEOUT if item == 'a' else None)
+    # 'a' is retried only after the fresh ids, and only then does the queue sleep
+    assert handed_out == ['a', 'b', 'c', 'a']
+    assert len(clock.slept) == 1